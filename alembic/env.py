@@ -0,0 +1,79 @@
+import asyncio
+from logging.config import fileConfig
+
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import async_engine_from_config
+
+from alembic import context
+
+from app.database import DATABASE_URL
+from models.models import metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# The same database as of application: SQLite or PostgreSQL
+config.set_main_option("sqlalchemy.url", DATABASE_URL)
+
+target_metadata = metadata
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    # Indexes declared for another database (Index.ddl_if in models/models.py) aren't compared
+    # Full-text index of SQLite and its shadow tables are created by raw DDL (models/models.py)
+    if type_ == "table" and reflected and name.startswith("booking_fts"):
+        return False
+    if type_ == "index" and not reflected and object._ddl_if is not None and not context.is_offline_mode():
+        return object._ddl_if._should_execute(None, object, context.get_bind())
+    return True
+
+
+def run_migrations_offline() -> None:
+    """
+    Emit SQL of migrations without connecting to database
+    """
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=DATABASE_URL.startswith("sqlite"),
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    # SQLite can't alter tables, they are recreated by batch operations
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object,
+                      render_as_batch=connection.dialect.name == "sqlite")
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connectable = async_engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,28 @@
+"""Add retirement time of datasets
+
+Revision ID: 3b7d91e4a2c6
+Revises: 8e1f4c7b2d90
+Create Date: 2026-10-18 16:41:05.283917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d91e4a2c6'
+down_revision: Union[str, None] = '8e1f4c7b2d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Datasets retired before have no time, they are dropped without delay
+    op.add_column('dataset', sa.Column('retired_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('dataset') as batch_op:
+        batch_op.drop_column('retired_at')
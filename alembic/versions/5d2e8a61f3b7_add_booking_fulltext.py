@@ -0,0 +1,48 @@
+"""Add full-text index of guest names in SQLite
+
+Revision ID: 5d2e8a61f3b7
+Revises: 3b7d91e4a2c6
+Create Date: 2026-10-18 19:12:37.604518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8a61f3b7'
+down_revision: Union[str, None] = '3b7d91e4a2c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copy of models.models.booking_fulltext_ddl at this revision
+FULLTEXT_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS booking_fts "
+    "USING fts5(guest_name, content='booking', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS booking_fts_insert AFTER INSERT ON booking BEGIN "
+    "INSERT INTO booking_fts(rowid, guest_name) VALUES (new.id, new.guest_name); END",
+    "CREATE TRIGGER IF NOT EXISTS booking_fts_delete AFTER DELETE ON booking BEGIN "
+    "INSERT INTO booking_fts(booking_fts, rowid, guest_name) VALUES ('delete', old.id, old.guest_name); END",
+    "CREATE TRIGGER IF NOT EXISTS booking_fts_update AFTER UPDATE OF guest_name ON booking BEGIN "
+    "INSERT INTO booking_fts(booking_fts, rowid, guest_name) VALUES ('delete', old.id, old.guest_name); "
+    "INSERT INTO booking_fts(rowid, guest_name) VALUES (new.id, new.guest_name); END",
+]
+
+
+def upgrade() -> None:
+    # PostgreSQL searches names by prefix with pattern index of "booking" table
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in FULLTEXT_DDL:
+        op.execute(statement)
+    # Index created on filling of the table by earlier versions may lack rows added since then
+    op.execute("INSERT INTO booking_fts(booking_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in ('booking_fts_insert', 'booking_fts_delete', 'booking_fts_update'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS booking_fts')
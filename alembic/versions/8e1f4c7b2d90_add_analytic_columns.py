@@ -0,0 +1,53 @@
+"""Add analytic columns to bookings
+
+Revision ID: 8e1f4c7b2d90
+Revises: c5a9210764cc
+Create Date: 2026-10-18 14:02:37.519204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e1f4c7b2d90'
+down_revision: Union[str, None] = 'c5a9210764cc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ANALYTIC_COLUMNS = [
+    sa.Column('hotel', sa.String(length=64), nullable=True),
+    sa.Column('country', sa.String(length=64), nullable=True),
+    sa.Column('meal', sa.String(length=64), nullable=True),
+    sa.Column('is_canceled', sa.Integer(), nullable=True),
+    sa.Column('is_repeated_guest', sa.Integer(), nullable=True),
+    sa.Column('adults', sa.Integer(), nullable=True),
+    sa.Column('children', sa.Integer(), nullable=True),
+    sa.Column('babies', sa.Integer(), nullable=True),
+    sa.Column('arrival_year', sa.Integer(), nullable=True),
+    sa.Column('arrival_month', sa.String(length=16), nullable=True),
+    sa.Column('booking_year', sa.Integer(), nullable=True),
+    sa.Column('booking_month', sa.Integer(), nullable=True),
+]
+
+
+def upgrade() -> None:
+    # Existing datasets keep empty analytic columns, their analytics are computed from files
+    op.add_column('dataset', sa.Column('has_analytic_columns', sa.Boolean(), server_default=sa.false(),
+                                       nullable=False))
+    for column in ANALYTIC_COLUMNS:
+        op.add_column('booking', column)
+    op.create_index('ix_booking_dataset_country', 'booking', ['dataset_id', 'country'])
+    op.create_index('ix_booking_dataset_meal', 'booking', ['dataset_id', 'meal'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_booking_dataset_meal', table_name='booking')
+    op.drop_index('ix_booking_dataset_country', table_name='booking')
+    with op.batch_alter_table('booking') as batch_op:
+        for column in reversed(ANALYTIC_COLUMNS):
+            batch_op.drop_column(column.name)
+    with op.batch_alter_table('dataset') as batch_op:
+        batch_op.drop_column('has_analytic_columns')
@@ -0,0 +1,29 @@
+"""Index bookings by dataset and id
+
+Revision ID: a7c3e9d15b42
+Revises: 5d2e8a61f3b7
+Create Date: 2026-10-18 20:03:51.447120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9d15b42'
+down_revision: Union[str, None] = '5d2e8a61f3b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pages ordered by id inside of dataset are read from index without sorting,
+    # index of dataset alone is its prefix and isn't needed anymore
+    op.create_index('ix_booking_dataset_id_id', 'booking', ['dataset_id', 'id'])
+    op.drop_index('ix_booking_dataset_id', table_name='booking')
+
+
+def downgrade() -> None:
+    op.create_index('ix_booking_dataset_id', 'booking', ['dataset_id'])
+    op.drop_index('ix_booking_dataset_id_id', table_name='booking')
@@ -0,0 +1,76 @@
+"""Create tables
+
+Revision ID: c5a9210764cc
+Revises: 
+Create Date: 2026-10-18 09:46:14.839943
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a9210764cc'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=320), nullable=False),
+    sa.Column('email', sa.String(length=320), nullable=False),
+    sa.Column('csvfile', sa.String(length=1024), nullable=True),
+    sa.Column('dataset_id', sa.Integer(), nullable=True),
+    sa.Column('hashed_password', sa.String(length=1024), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('is_superuser', sa.Boolean(), nullable=False),
+    sa.Column('is_verified', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('dataset',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=1024), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('booking',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('booking_date', sa.Date(), nullable=True),
+    sa.Column('length_of_stay', sa.Integer(), nullable=True),
+    sa.Column('guest_name', sa.String(length=1024), nullable=True),
+    sa.Column('daily_rate', sa.Float(), nullable=True),
+    sa.Column('dataset_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['dataset_id'], ['dataset.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_booking_dataset_id', 'booking', ['dataset_id'])
+    op.create_index('ix_booking_dataset_length_of_stay_id', 'booking', ['dataset_id', 'length_of_stay', 'id'])
+
+    # Pages of bookings put empty values first (see models/models.py)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_booking_dataset_booking_date_nulls_first_id', 'booking',
+                        ['dataset_id', sa.text('booking_date NULLS FIRST'), 'id'])
+        op.create_index('ix_booking_dataset_daily_rate_nulls_first_id', 'booking',
+                        ['dataset_id', sa.text('daily_rate NULLS FIRST'), 'id'])
+        op.create_index('ix_booking_dataset_guest_name', 'booking', ['dataset_id', 'guest_name'],
+                        postgresql_ops={'guest_name': 'text_pattern_ops'})
+    else:
+        op.create_index('ix_booking_dataset_booking_date_id', 'booking', ['dataset_id', 'booking_date', 'id'])
+        op.create_index('ix_booking_dataset_daily_rate_id', 'booking', ['dataset_id', 'daily_rate', 'id'])
+    # Full-text index of SQLite is created by migration 5d2e8a61f3b7
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS booking_fts')
+    op.drop_table('booking')
+    op.drop_table('dataset')
+    op.drop_table('user')
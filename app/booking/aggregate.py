@@ -0,0 +1,284 @@
+"""
+Declarative aggregation of the dataset for /bookings/aggregate.
+
+Request is group-by dimensions, metrics (count of bookings; sum, mean, min or max of
+adr, revenue, stay or guests), equality filters on dimensions and optional top-N by a metric.
+It is computed in one vectorized pass: partial aggregates (counts, sums, minimums,
+maximums) of filtered facts are grouped once and metrics are derived from them.
+Requests covered by aggregate cube (its dimensions, no min/max) are answered from the cube,
+large datasets are aggregated by chunks (see app.booking.streaming).
+"""
+import os
+from enum import Enum
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi import Query
+
+from app.booking import streaming
+from app.booking.cube import CUBE_DIMENSIONS
+from app.booking.cube import load_cube
+from app.booking.dates import DATE_COLUMNS
+from app.booking.dates import booking_dates
+from app.booking.utils import load_dataframe
+from app.metrics import span
+
+# Results with more groups are refused, unless they are limited by "top"
+AGGREGATE_MAX_GROUPS = int(os.getenv('AGGREGATE_MAX_GROUPS', '10000'))
+
+
+class Dimension(Enum):
+    hotel = "hotel"
+    country = "country"
+    meal = "meal"
+    market_segment = "market_segment"
+    distribution_channel = "distribution_channel"
+    customer_type = "customer_type"
+    deposit_type = "deposit_type"
+    reserved_room_type = "reserved_room_type"
+    assigned_room_type = "assigned_room_type"
+    reservation_status = "reservation_status"
+    is_canceled = "is_canceled"
+    is_repeated_guest = "is_repeated_guest"
+    arrival_year = "arrival_year"
+    arrival_month = "arrival_month"
+    booking_year = "booking_year"
+    booking_month = "booking_month"
+
+
+# Dimensions with numeric values, their filters are parsed as integers
+INTEGER_DIMENSIONS = ['is_canceled', 'is_repeated_guest', 'arrival_year', 'booking_year', 'booking_month']
+# Dimensions named otherwise in dataset
+DIMENSION_COLUMNS = {'arrival_year': 'arrival_date_year', 'arrival_month': 'arrival_date_month'}
+
+MEASURES = ['adr', 'revenue', 'stay', 'guests']
+FUNCTIONS = ['sum', 'mean', 'min', 'max']
+# Columns of dataset necessary for computing each measure
+MEASURE_COLUMNS = {'adr': ['adr'],
+                   'revenue': ['adr', 'stays_in_week_nights', 'stays_in_weekend_nights'],
+                   'stay': ['stays_in_week_nights', 'stays_in_weekend_nights'],
+                   'guests': ['adults', 'children', 'babies']}
+# Sums of measures in cube and column counting their present values
+CUBE_MEASURES = {'adr': ('adr_sum', 'adr_count'),
+                 'revenue': ('revenue_sum', 'adr_count'),
+                 'stay': ('stay_sum', 'bookings'),
+                 'guests': ('guests_sum', 'bookings')}
+
+# Metrics are "count" (of bookings) and "<function>_<measure>", e.g. "mean_adr"
+Metric = Enum('Metric', {name: name for name in ['count'] + [f'{function}_{measure}'
+                                                              for function in FUNCTIONS
+                                                              for measure in MEASURES]})
+
+
+class AggregateParams:
+    """
+    Parameters of aggregation. args() are passed to aggregate() in worker process
+    """
+
+    def __init__(self,
+                 group_by: list[Dimension] = Query(default=[]),
+                 metrics: list[Metric] = Query(default=[Metric.count]),
+                 filters: list[str] = Query(default=[], alias='filter',
+                                            description='"dimension:value", e.g. "hotel:Resort Hotel". '
+                                                        'Values of one dimension are combined by OR'),
+                 top: int | None = Query(default=None, gt=0, le=AGGREGATE_MAX_GROUPS),
+                 order_by: Metric | None = Query(default=None,
+                                                 description='Metric of top, the first metric by default')):
+        self.group_by = list(dict.fromkeys(dimension.value for dimension in group_by))
+        self.metrics = list(dict.fromkeys(metric.value for metric in metrics))
+        self.filters = self.parse_filters(filters)
+        self.top = top
+        self.order_by = order_by.value if order_by is not None else self.metrics[0]
+        if self.order_by not in self.metrics:
+            self.metrics.append(self.order_by)
+
+    @staticmethod
+    def parse_filters(filters: list[str]) -> dict[str, list]:
+        result = {}
+        for item in filters:
+            name, separator, value = item.partition(':')
+            if name not in Dimension.__members__ or not separator:
+                raise HTTPException(status_code=400,
+                                    detail=f'Filter "{item}" must be "dimension:value" with one of dimensions: '
+                                           f'{", ".join(Dimension.__members__)}')
+            if name in INTEGER_DIMENSIONS:
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail=f'Value of filter "{item}" must be integer')
+            result.setdefault(name, []).append(value)
+        return result
+
+    def args(self) -> tuple:
+        """
+        Hashable arguments of aggregate(), requests with the same arguments are coalesced
+        """
+        return (tuple(self.group_by), tuple(self.metrics),
+                tuple((name, tuple(values)) for name, values in sorted(self.filters.items())),
+                self.top, self.order_by)
+
+
+def _parse_metric(metric: str) -> tuple[str, str | None]:
+    if metric == 'count':
+        return 'count', None
+    function, measure = metric.split('_', 1)
+    return function, measure
+
+
+def _source_columns(dimensions: list[str], measures: list[str]) -> list[str]:
+    columns = []
+    for dimension in dimensions:
+        if dimension in ('booking_year', 'booking_month'):
+            columns += DATE_COLUMNS
+        else:
+            columns.append(DIMENSION_COLUMNS.get(dimension, dimension))
+    for measure in measures:
+        columns += MEASURE_COLUMNS[measure]
+    return list(dict.fromkeys(columns))
+
+
+def facts(df: pd.DataFrame, dimensions: list[str], measures: list[str]) -> pd.DataFrame:
+    """
+    Dimensions and measures of each booking of dataset "df"
+    """
+    result = pd.DataFrame(index=df.index)
+    if 'booking_year' in dimensions or 'booking_month' in dimensions:
+        dates = booking_dates(df)
+    for dimension in dimensions:
+        if dimension in ('booking_year', 'booking_month'):
+            result[dimension] = dates[dimension]
+        else:
+            result[dimension] = df[DIMENSION_COLUMNS.get(dimension, dimension)]
+
+    stay = df['stays_in_week_nights'] + df['stays_in_weekend_nights'] if {'revenue', 'stay'} & set(measures) else None
+    for measure in measures:
+        if measure == 'adr':
+            result['adr'] = df['adr']
+        elif measure == 'revenue':
+            result['revenue'] = df['adr'] * stay
+        elif measure == 'stay':
+            result['stay'] = stay
+        else:
+            result['guests'] = df[['adults', 'children', 'babies']].sum(axis=1)
+    return result
+
+
+def _filter(df: pd.DataFrame, filters: tuple) -> pd.DataFrame:
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for name, values in filters:
+        mask &= df[name].isin(values).to_numpy()
+    return df[mask]
+
+
+def _keys(df: pd.DataFrame, dimensions: list[str]) -> list:
+    # Without dimensions all rows are one group
+    return dimensions or [np.zeros(len(df), dtype=np.int8)]
+
+
+def partial_aggregates(df: pd.DataFrame, dimensions: list[str], measures: list[str],
+                       functions: set[str]) -> pd.DataFrame:
+    """
+    Count of bookings and sums, counts of present values, minimums and maximums of measures
+    by groups of "dimensions" in facts "df"
+    """
+    aggregations = {'count': ('_rows', 'size')}
+    for measure in measures:
+        aggregations[f'{measure}_sum'] = (measure, 'sum')
+        aggregations[f'{measure}_count'] = (measure, 'count')
+        if 'min' in functions:
+            aggregations[f'{measure}_min'] = (measure, 'min')
+        if 'max' in functions:
+            aggregations[f'{measure}_max'] = (measure, 'max')
+
+    df = df.assign(_rows=0)
+    return df.groupby(_keys(df, dimensions), observed=True).agg(**aggregations)
+
+
+def combine_partials(parts: list[pd.DataFrame], dimensions: list[str]) -> pd.DataFrame:
+    """
+    Partial aggregates of all chunks from partial aggregates of each chunk
+    """
+    if len(parts) == 1:
+        return parts[0]
+    combined = pd.concat(parts)
+    functions = {column: 'min' if column.endswith('_min') else 'max' if column.endswith('_max') else 'sum'
+                 for column in combined.columns}
+    levels = list(range(combined.index.nlevels))
+    return combined.groupby(level=levels, observed=True).agg(functions)
+
+
+def cube_partials(cube: pd.DataFrame, dimensions: list[str], measures: list[str]) -> pd.DataFrame:
+    """
+    Partial aggregates (without minimums and maximums) from aggregate cube
+    """
+    columns = {'count': 'bookings'}
+    for measure in measures:
+        columns[f'{measure}_sum'], columns[f'{measure}_count'] = CUBE_MEASURES[measure]
+    sums = cube.groupby(_keys(cube, dimensions), observed=True)[list(dict.fromkeys(columns.values()))].sum()
+    return pd.DataFrame({name: sums[column] for name, column in columns.items()}, index=sums.index)
+
+
+def metrics_result(partials: pd.DataFrame, dimensions: list[str], metrics: list[str],
+                   top: int | None, order_by: str) -> dict | None:
+    """
+    Rows of groups with their metrics. None if there are more than AGGREGATE_MAX_GROUPS
+    groups and "top" isn't set
+    """
+    if top is None and len(partials) > AGGREGATE_MAX_GROUPS:
+        return None
+
+    result = pd.DataFrame(index=partials.index)
+    for metric in metrics:
+        function, measure = _parse_metric(metric)
+        if function == 'count':
+            result[metric] = partials['count']
+        elif function == 'mean':
+            # Mean of group without present values is missing
+            counts = partials[f'{measure}_count']
+            result[metric] = partials[f'{measure}_sum'] / counts.where(counts > 0)
+        else:
+            result[metric] = partials[f'{measure}_{function}']
+
+    groups = len(result)
+    if top is not None:
+        result = result.sort_values(order_by, ascending=False, kind='stable').head(top)
+    result = result.reset_index(drop=not dimensions)
+
+    return {'groups': groups,
+            'rows': result.to_dict('records')}
+
+
+def aggregate(path: str, dimensions: tuple, metrics: tuple, filters: tuple, top: int | None, order_by: str):
+    """
+    Metrics by groups of dimensions of dataset stored in "path" (see AggregateParams)
+    """
+    dimensions, metrics = list(dimensions), list(metrics)
+    parsed = [_parse_metric(metric) for metric in metrics]
+    functions = {function for function, _ in parsed}
+    measures = list(dict.fromkeys(measure for _, measure in parsed if measure is not None))
+    used = list(dict.fromkeys(dimensions + [name for name, _ in filters]))
+
+    if set(used) <= set(CUBE_DIMENSIONS) and functions <= {'count', 'sum', 'mean'}:
+        cube = _filter(load_cube(path), filters)
+        with span('groupby'):
+            partials = cube_partials(cube, dimensions, measures)
+        return metrics_result(partials, dimensions, metrics, top, order_by)
+
+    columns = _source_columns(used, measures)
+    if streaming.is_large(path):
+        chunks = streaming.chunks(path, columns)
+    else:
+        chunks = [load_dataframe(path, columns)]
+
+    parts = []
+    for chunk in chunks:
+        chunk = _filter(facts(chunk, used, measures), filters)
+        with span('groupby'):
+            parts.append(partial_aggregates(chunk, dimensions, measures, functions))
+    with span('groupby'):
+        partials = combine_partials(parts, dimensions)
+
+    return metrics_result(partials, dimensions, metrics, top, order_by)
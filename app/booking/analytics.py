@@ -0,0 +1,285 @@
+"""
+Computations behind analytics endpoints of /bookings.
+
+Functions are module-level and take path of dataset and plain parameters,
+so they can be executed in worker processes (see app.booking.executor).
+Datasets larger than STREAMING_THRESHOLD are aggregated by chunks (see app.booking.streaming).
+"""
+from enum import Enum
+
+import pandas as pd
+
+from app.booking import streaming
+from app.booking.cube import load_cube
+from app.booking.dates import arrival_weekdays
+from app.booking.dates import booking_dates
+from app.booking.dates import day_names
+from app.booking.dates import month_names
+from app.booking.schema import format_dates
+from app.booking.utils import analysis_result
+from app.booking.utils import booking_month_names
+from app.booking.utils import load_country_index
+from app.booking.utils import load_dataframe
+from app.metrics import span
+from app.serialization import nested_dict
+
+
+class Type(Enum):
+    booking = "booking"
+    arrival = "arrival"
+
+
+def stats(path: str):
+    """
+    Describing statistical information about dataset
+    """
+    if streaming.is_large(path):
+        result = streaming.describe(path)
+    else:
+        # Parsed dates are described by pandas too, statistics are shown for numbers only
+        result = load_dataframe(path).describe(include='number')
+
+    result_dict = result.to_dict()
+
+    # Statistics of each column are also grouped by its first and second letters
+    for column in result.columns:
+        result_dict.setdefault(column[0], {})[column[1]] = result[column].to_dict()
+
+    return result_dict
+
+
+ANALYSIS_COLUMNS = ['hotel', 'is_canceled', 'adr', 'stays_in_week_nights', 'stays_in_weekend_nights',
+                    'arrival_date_day_of_month', 'arrival_date_month', 'arrival_date_year', 'lead_time']
+
+
+def revenue(df, is_canceled: bool, type_group: Type):
+    """
+    Revenue of each booking with its year and month of booking or arrival
+    """
+    if not is_canceled:
+        df = df[df['is_canceled'] == 0]
+
+    # Find revenue for each booking
+    df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
+    df['total_revenue'] = df['adr'] * df['total_stay']
+
+    if type_group == Type.booking:
+        dates = booking_dates(df)
+        df['year'] = dates['booking_year']
+        df['month'] = dates['booking_month']
+    else:
+        df['year'] = df['arrival_date_year']
+        df['month'] = df['arrival_date_month']
+
+    return df
+
+
+def analysis(path: str, is_canceled: bool, type_group: Type):
+    """
+    Mean revenue by booking or arrival month, grouped by year for each hotel
+    """
+    if streaming.is_large(path):
+        frames = (revenue(chunk, is_canceled, type_group) for chunk in streaming.chunks(path, ANALYSIS_COLUMNS))
+        with span('groupby'):
+            means = streaming.grouped_mean(frames, ['hotel', 'year', 'month'], 'total_revenue')
+        return analysis_means_result(means.rename('total_revenue').reset_index(), type_group)
+
+    df = revenue(load_dataframe(path, ANALYSIS_COLUMNS), is_canceled, type_group)
+
+    # Create 2 DataFrames with booking for only one type of hotel
+    df_resort = df[(df['hotel'] == 'Resort Hotel')]
+    df_city = df[(df['hotel'] == 'City Hotel')]
+
+    with span('groupby'):
+        result_resort = df_resort.groupby(['year', 'month'], observed=True)['total_revenue'].mean().reset_index()
+        result_city = df_city.groupby(['year', 'month'], observed=True)['total_revenue'].mean().reset_index()
+
+    return hotels_result(result_resort, result_city, type_group)
+
+
+def analysis_means_result(means, type_group: Type):
+    """
+    Result of analysis from mean revenues of all hotels: columns hotel, year, month, total_revenue
+    """
+    means = means.sort_values(['year', 'month'])
+    result_resort = means[means['hotel'] == 'Resort Hotel'].drop(columns='hotel').reset_index(drop=True)
+    result_city = means[means['hotel'] == 'City Hotel'].drop(columns='hotel').reset_index(drop=True)
+
+    return hotels_result(result_resort, result_city, type_group)
+
+
+def hotels_result(result_resort, result_city, type_group: Type):
+    """
+    Result of analysis from mean revenues of each hotel: columns year, month, total_revenue
+    """
+    if type_group == Type.booking:
+        result_resort = booking_month_names(result_resort)
+        result_city = booking_month_names(result_city)
+
+    result = analysis_result(result_resort, result_city)
+
+    return result
+
+
+def by_nationality(path: str, nationality: str, start: int, step: int):
+    """
+    Bookings of "nationality" from "start" position to "start+step".
+    Returns None if country is absent in dataset
+    """
+    if streaming.is_large(path):
+        result = streaming.find_rows(path, 'country', nationality.upper(), start, step)
+        return None if result is None else format_dates(result).to_dict('index')
+
+    positions = load_country_index(path).get(nationality.upper())
+    if positions is None:
+        return None
+
+    result = load_dataframe(path).take(positions[start:(start + step)])
+
+    return format_dates(result).to_dict('index')
+
+
+def popular_meal_package(path: str):
+    """
+    The most popular meal package
+    """
+    if streaming.is_large(path):
+        result = streaming.value_counts(path, 'meal').head(1)
+    else:
+        result = load_dataframe(path, ['meal'])['meal'].value_counts().head(1)
+
+    return result.to_dict()
+
+
+def avg_length_of_stay(path: str):
+    """
+    Average length of stay grouped by hotel type and booking year
+    """
+    cube = load_cube(path)
+
+    result = cube.groupby(['hotel', 'booking_year'], observed=True)[['stay_sum', 'bookings']].sum()
+    result = (result['stay_sum'] / result['bookings']).round(2)
+
+    return nested_dict(result)
+
+
+def total_revenue(path: str):
+    """
+    Total revenue grouped by hotel type and booking month
+    """
+    cube = load_cube(path)
+
+    result = cube.groupby(['hotel', 'booking_month'], observed=True)['revenue_sum'].sum().round(2)
+    result.index = result.index.set_levels(month_names(result.index.levels[1]), level=1)
+    result = result.sort_index()
+
+    return nested_dict(result)
+
+
+def top_countries(path: str):
+    """
+    Top 5 countries with the highest number of bookings
+    """
+    if streaming.is_large(path):
+        result = streaming.value_counts(path, 'country').head(5)
+    else:
+        result = load_dataframe(path, ['country'])['country'].value_counts().head(5)
+
+    return {"data": result.to_dict()}
+
+
+def repeated_guests_percentage(path: str):
+    """
+    Percentage of repeated guests among all bookings
+    """
+    if streaming.is_large(path):
+        counts = streaming.value_counts(path, 'is_repeated_guest', dropna=False)
+        result = (counts.get(1, 0) / counts.sum()) * 100
+    else:
+        df = load_dataframe(path, ['is_repeated_guest'])
+        result = (len(df[df['is_repeated_guest'] == 1]) / len(df)) * 100
+
+    return {"result": f'{result:.4f}'}
+
+
+def total_guests_by_year(path: str):
+    """
+    Total number of guests (adults, children, and babies) by arrival year
+    """
+    cube = load_cube(path)
+
+    result = cube.groupby(['arrival_year'])['guests_sum'].sum()
+
+    return result.to_dict()
+
+
+def avg_daily_rate_resort(path: str):
+    """
+    Average daily rate by arrival month for resort hotel bookings
+    """
+    cube = load_cube(path)
+
+    result = cube[cube['hotel'] == "Resort Hotel"].groupby(['arrival_month'], observed=True)[['adr_sum',
+                                                                                                'adr_count']].sum()
+    result = (result['adr_sum'] / result['adr_count']).sort_values(ascending=False).round(2)
+
+    return result.to_dict()
+
+
+ARRIVAL_COLUMNS = ['hotel', 'arrival_date_year', 'arrival_date_month', 'arrival_date_day_of_month']
+
+
+def city_arrival_days(df):
+    """
+    Day of the week of arrival for each city hotel booking
+    """
+    new_df = df[df['hotel'] == "City Hotel"][['arrival_date_year',
+                                              'arrival_date_month',
+                                              'arrival_date_day_of_month']]
+    return pd.Series(day_names(arrival_weekdays(new_df)), name='date')
+
+
+def most_common_arrival_day_city(path: str):
+    """
+    The most common arrival day of the week for city hotel bookings
+    """
+    if streaming.is_large(path):
+        result = streaming.combine_counts(city_arrival_days(chunk).value_counts()
+                                          for chunk in streaming.chunks(path, ARRIVAL_COLUMNS)).head(1)
+    else:
+        result = city_arrival_days(load_dataframe(path, ARRIVAL_COLUMNS)).value_counts().head(1)
+
+    return result.to_dict()
+
+
+def count_by_hotel_meal(path: str):
+    """
+    Count of bookings grouped by hotel type and meal package
+    """
+    cube = load_cube(path)
+
+    result = cube.groupby(['hotel', 'meal'], observed=True)['adr_count'].sum()
+
+    return nested_dict(result)
+
+
+def total_revenue_resort_by_country(path: str):
+    """
+    Total revenue by country for resort hotel bookings
+    """
+    cube = load_cube(path)
+
+    result = cube[cube['hotel'] == "Resort Hotel"].groupby(['country'], observed=True)['revenue_sum'].sum()
+
+    return result.to_dict()
+
+
+def count_by_hotel_repeated_guest(path: str):
+    """
+    Count of bookings grouped by hotel type and repeated guest status
+    """
+    cube = load_cube(path)
+
+    result = cube.groupby(['hotel', 'is_repeated_guest'], observed=True)['adr_count'].sum()
+
+    return nested_dict(result)
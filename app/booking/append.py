@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import pandas as pd
+
+from app.booking.cache import dataframe_cache
+from app.booking.cache import file_key
+from app.booking.cache import read_csv
+from app.booking.columnar import CUBE_SUFFIX
+from app.booking.columnar import append_sidecar
+from app.booking.columnar import count_rows
+from app.booking.columnar import is_sidecar_fresh
+from app.booking.columnar import read_derived
+from app.booking.columnar import remove_derived
+from app.booking.columnar import write_derived
+from app.booking.cube import append_cube
+from app.booking.schema import apply_schema
+from app.booking.streaming import append_describe
+from app.booking.utils import append_country_index
+
+
+def read_header(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.readline().rstrip(b'\r\n')
+
+
+def has_rows(path: str) -> bool:
+    """
+    Whether CSV file "path" has rows besides its header, blank lines aren't rows
+    """
+    return not pd.read_csv(path, nrows=1).empty
+
+
+def append_lines(path: str, delta_path: str) -> None:
+    """
+    Append rows of CSV file "delta_path" (without its header) to CSV file "path"
+    """
+    with open(path, 'rb+') as file, open(delta_path, 'rb') as delta:
+        delta.readline()
+        file.seek(0, 2)
+        if file.tell():
+            file.seek(-1, 2)
+            if file.read(1) != b'\n':
+                file.write(b'\n')
+        shutil.copyfileobj(delta, file)
+
+
+def append_dataset(path: str, delta_path: str) -> tuple[tuple, tuple, pd.DataFrame]:
+    """
+    Append bookings of CSV file "delta_path" with the same header to dataset stored in "path".
+
+    Derived files are updated by new rows only: sidecar and cube file.
+    Returns versions of the file before and after appending and appended rows,
+    cached state of dataset is updated by them (see append_cached).
+    """
+    rows_before = count_rows(path)
+    sidecar_fresh = is_sidecar_fresh(path)
+    cube = read_derived(path, CUBE_SUFFIX)
+    key = file_key(path)
+
+    delta = apply_schema(read_csv(delta_path))
+    delta.index = pd.RangeIndex(rows_before, rows_before + len(delta))
+
+    append_lines(path, delta_path)
+
+    if sidecar_fresh:
+        append_sidecar(path, delta_path)
+    if cube is not None:
+        write_derived(append_cube(cube, delta), path, CUBE_SUFFIX)
+
+    return key, file_key(path), delta
+
+
+def append_cached(path: str, key: tuple, new_key: tuple, delta: pd.DataFrame) -> dict:
+    """
+    Update dataset cache of the process by rows "delta" appended to file: cached columns,
+    cube, country index and describe of large files. Returns statistics of the cache.
+    """
+    dataframe_cache.append(path, key, delta, {'cube': append_cube,
+                                              'country_index': append_country_index,
+                                              'describe': append_describe}, new_key)
+    return dataframe_cache.stats()
+
+
+def truncate_dataset(path: str, size: int) -> None:
+    """
+    Undo append to dataset stored in "path": cut the file to its previous "size".
+    Derived files have been updated by appended rows, so they are removed.
+    """
+    os.truncate(path, size)
+    remove_derived(path)
@@ -0,0 +1,241 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any
+from typing import Callable
+
+import pandas as pd
+
+from app.booking import schema
+
+DATAFRAME_CACHE_BUDGET = int(os.getenv('DATAFRAME_CACHE_BUDGET_MB', '512')) * 1024 * 1024
+
+# loader(path, columns) -> DataFrame. "columns" is None for all columns of the file
+Loader = Callable[[str, list[str] | None], pd.DataFrame]
+
+
+def enable_copy_on_write() -> None:
+    """
+    Cached frames are shared between requests. With copy-on-write every shallow copy
+    handed out by the cache behaves as an independent frame, so endpoints can add or
+    overwrite columns without touching the cached data.
+
+    The option is global for pandas of the process, so it is set on startup of every
+    process using the cache: the application (main.py) and analytics workers.
+    """
+    pd.set_option('mode.copy_on_write', True)
+
+
+def file_key(path: str) -> tuple:
+    """
+    Version of the file on disk: (path, mtime, size).
+    Any rewrite of the file produces a new key.
+    """
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def sizeof(value: Any) -> int:
+    """
+    Approximate memory usage of cached value in bytes
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def read_csv(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    return pd.read_csv(path, usecols=columns)
+
+
+class CacheEntry:
+    """
+    Columns of one file version loaded so far. "complete" is True when
+    all columns of the file have been loaded. "derived" keeps values computed
+    from this file version (aggregates, indexes) by name.
+    """
+
+    def __init__(self, key: tuple, frame: pd.DataFrame, complete: bool,
+                 derived: dict | None = None, frame_nbytes: int | None = None):
+        self.key = key
+        self.frame = frame
+        self.complete = complete
+        self.derived = derived or {}
+        # Deep memory usage of object columns is expensive, so it is passed on when frame is reused
+        self.frame_nbytes = sizeof(frame) if frame_nbytes is None else frame_nbytes
+        self.nbytes = self.frame_nbytes + sum(sizeof(value) for value in self.derived.values())
+
+
+class DataFrameCache:
+    """
+    LRU cache of parsed datasets bounded by memory budget (in bytes).
+
+    Entries are keyed by (path, mtime, size) of the source file, so a changed file
+    is never served from cache even without explicit invalidation. Columns are
+    loaded lazily: a request for columns absent in the entry loads only them.
+    """
+
+    def __init__(self, memory_budget: int = DATAFRAME_CACHE_BUDGET):
+        self.memory_budget = memory_budget
+        self.memory_usage = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, columns: list[str] | None = None, loader: Loader = read_csv) -> pd.DataFrame:
+        key = file_key(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key != key:
+                entry = None
+            if entry is not None and (entry.complete if columns is None else
+                                      set(columns).issubset(entry.frame.columns)):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return self._view(entry.frame, columns)
+            self.misses += 1
+            missing = None if columns is None or entry is None else \
+                [column for column in columns if column not in entry.frame.columns]
+
+        frame = loader(path, missing if entry is not None else columns)
+
+        if entry is not None and missing is not None:
+            frame_nbytes = entry.frame_nbytes + sizeof(frame)
+            frame = pd.concat([entry.frame, frame], axis=1)
+            entry = CacheEntry(key, frame, entry.complete, entry.derived, frame_nbytes)
+        else:
+            entry = CacheEntry(key, frame, columns is None, entry.derived if entry is not None else None)
+        self._put(entry)
+
+        return self._view(frame, columns)
+
+    def derived(self, path: str, name: str, build: Callable[[str], Any]) -> Any:
+        """
+        Value "name" computed by build(path) from current version of file.
+        It is kept with cached columns of the file and dropped with them.
+        """
+        key = file_key(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key == key and name in entry.derived:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return self._derived_view(entry.derived[name])
+            self.misses += 1
+
+        value = build(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry.key != key:
+                entry = CacheEntry(key, pd.DataFrame(), False)
+        self._put(CacheEntry(key, entry.frame, entry.complete, {**entry.derived, name: value}, entry.frame_nbytes))
+
+        return self._derived_view(value)
+
+    def append(self, path: str, key: tuple, delta: pd.DataFrame,
+               updates: dict[str, Callable[[Any, pd.DataFrame], Any]] | None = None,
+               new_key: tuple | None = None) -> None:
+        """
+        Rows "delta" have been appended to file, which was version "key" before
+        and is version "new_key" after (current version if None).
+        Cached columns are extended by delta instead of reading the file again.
+        Derived values are updated by updates[name](value, delta), others are dropped.
+        Index of delta must continue index of the file.
+        """
+        new_key = file_key(path) if new_key is None else new_key
+        updates = updates or {}
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry.key != key:
+                return
+
+        frame = entry.frame
+        frame_nbytes = entry.frame_nbytes
+        if len(frame.columns):
+            rows = delta[list(frame.columns)]
+            frame = schema.concat([frame, rows])
+            frame_nbytes += sizeof(rows)
+        derived = {name: updates[name](value, delta) for name, value in entry.derived.items() if name in updates}
+
+        self._put(CacheEntry(new_key, frame, entry.complete, derived, frame_nbytes))
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            if self._remove(path) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self.memory_usage = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'memory_usage': self.memory_usage,
+                    'memory_budget': self.memory_budget,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations}
+
+    @staticmethod
+    def _view(frame: pd.DataFrame, columns: list[str] | None) -> pd.DataFrame:
+        if columns is None:
+            return frame.copy(deep=False)
+        return frame[columns]
+
+    @staticmethod
+    def _derived_view(value: Any) -> Any:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value.copy(deep=False)
+        return value
+
+    def _put(self, entry: CacheEntry) -> None:
+        if entry.nbytes > self.memory_budget:
+            # Frame alone doesn't fit in budget, serve it without caching
+            return
+
+        with self._lock:
+            current = self._entries.get(entry.key[0])
+            if current is not None and current.key == entry.key:
+                if current.complete and not entry.complete:
+                    # Concurrent request has already loaded the whole file
+                    entry = CacheEntry(entry.key, current.frame, True, {**current.derived, **entry.derived},
+                                       current.frame_nbytes)
+                else:
+                    entry = CacheEntry(entry.key, entry.frame, entry.complete, {**current.derived, **entry.derived},
+                                       entry.frame_nbytes)
+            self._remove(entry.key[0])
+            while self._entries and self.memory_usage + entry.nbytes > self.memory_budget:
+                _, evicted = self._entries.popitem(last=False)
+                self.memory_usage -= evicted.nbytes
+                self.evictions += 1
+            self._entries[entry.key[0]] = entry
+            self.memory_usage += entry.nbytes
+
+    def _remove(self, path: str) -> CacheEntry | None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.memory_usage -= entry.nbytes
+        return entry
+
+
+dataframe_cache = DataFrameCache()
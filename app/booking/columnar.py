@@ -0,0 +1,246 @@
+import os
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from app.booking.cache import file_key
+from app.booking.cache import read_csv
+from app.booking.schema import apply_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # Sidecars are optional, datasets are read from CSV then
+    pa = None
+
+SIDECAR_SUFFIX = '.parquet'
+CUBE_SUFFIX = '.cube.parquet'
+DERIVED_SUFFIXES = [SIDECAR_SUFFIX, CUBE_SUFFIX]
+
+# Types of columns in sidecar. They match what pd.read_csv infers for a valid booking file,
+# so frames read from sidecar and from CSV are the same.
+INTEGER_COLUMNS = ['is_canceled', 'lead_time', 'arrival_date_year', 'arrival_date_week_number',
+                   'arrival_date_day_of_month', 'stays_in_weekend_nights', 'stays_in_week_nights', 'adults',
+                   'babies', 'is_repeated_guest', 'previous_cancellations', 'previous_bookings_not_canceled',
+                   'booking_changes', 'days_in_waiting_list', 'required_car_parking_spaces',
+                   'total_of_special_requests']
+FLOAT_COLUMNS = ['adr', 'children', 'agent', 'company']
+STRING_COLUMNS = ['hotel', 'arrival_date_month', 'meal', 'country', 'market_segment', 'distribution_channel',
+                  'reserved_room_type', 'assigned_room_type', 'deposit_type', 'customer_type',
+                  'reservation_status', 'reservation_status_date', 'name', 'email', 'phone-number',
+                  'credit_card']
+
+
+def derived_path(path: str, suffix: str) -> str:
+    """
+    Path of file derived from dataset: hidden file next to it, e.g.
+    temporary/data.csv -> temporary/.data.csv<suffix>
+    """
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, '.' + filename + suffix)
+
+
+def sidecar_path(path: str) -> str:
+    """
+    Path of columnar copy of CSV file, e.g. temporary/data.csv -> temporary/.data.csv.parquet
+    """
+    return derived_path(path, SIDECAR_SUFFIX)
+
+
+def _source_metadata(path: str) -> dict:
+    _, mtime, size = file_key(path)
+    return {b'source_mtime_ns': str(mtime).encode(), b'source_size': str(size).encode()}
+
+
+def is_derived_fresh(path: str, suffix: str) -> bool:
+    """
+    Derived Parquet file is fresh if it was built from current version of dataset file
+    """
+    if pa is None or not os.path.isfile(derived_path(path, suffix)):
+        return False
+    try:
+        metadata = pq.read_schema(derived_path(path, suffix)).metadata or {}
+    except (OSError, pa.ArrowException):
+        return False
+    source = _source_metadata(path)
+    return all(metadata.get(k) == v for k, v in source.items())
+
+
+def is_sidecar_fresh(path: str) -> bool:
+    return is_derived_fresh(path, SIDECAR_SUFFIX)
+
+
+def write_derived(df: pd.DataFrame, path: str, suffix: str) -> bool:
+    """
+    Save "df" computed from dataset stored in "path" as derived Parquet file,
+    tagged with version of dataset file. Returns False if pyarrow is not installed
+    or file can't be written (e.g. directory of dataset is read-only).
+    """
+    if pa is None:
+        return False
+
+    target = derived_path(path, suffix)
+    temporary = target + '.part'
+    metadata = _source_metadata(path)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        pq.write_table(table, temporary)
+        os.replace(temporary, target)
+    except (OSError, pa.ArrowException):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+
+    return True
+
+
+def read_derived(path: str, suffix: str) -> pd.DataFrame | None:
+    """
+    Read derived Parquet file of dataset stored in "path", None if it is missing or stale
+    """
+    if not is_derived_fresh(path, suffix):
+        return None
+    return _from_arrow(pq.read_table(derived_path(path, suffix)))
+
+
+def _open_csv(path: str):
+    column_types = {column: pa.int64() for column in INTEGER_COLUMNS}
+    column_types.update({column: pa.float64() for column in FLOAT_COLUMNS})
+    column_types.update({column: pa.string() for column in STRING_COLUMNS})
+    # Empty strings are missing values, as in pd.read_csv
+    return pa_csv.open_csv(path, convert_options=pa_csv.ConvertOptions(column_types=column_types,
+                                                                        strings_can_be_null=True))
+
+
+def write_sidecar(path: str) -> bool:
+    """
+    Convert CSV file to typed Parquet sidecar in streaming mode
+    (memory is bounded by pyarrow block size, not by file size).
+    Returns False if pyarrow is not installed or file can't be converted.
+    """
+    if pa is None:
+        return False
+
+    target = sidecar_path(path)
+    temporary = target + '.part'
+    metadata = _source_metadata(path)
+    try:
+        reader = _open_csv(path)
+        schema = reader.schema.with_metadata(metadata)
+        with pq.ParquetWriter(temporary, schema) as writer:
+            for batch in reader:
+                writer.write_table(pa.Table.from_batches([batch]).replace_schema_metadata(metadata))
+        os.replace(temporary, target)
+    except (OSError, pa.ArrowException):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+
+    if _source_metadata(path) != metadata:
+        # CSV has been rewritten during conversion
+        os.remove(target)
+        return False
+
+    return True
+
+
+def append_sidecar(path: str, delta_path: str) -> bool:
+    """
+    Update sidecar after rows of CSV file "delta_path" have been appended to dataset
+    stored in "path". Sidecar must have been fresh before appending: its batches are
+    copied as they are, only new rows are converted from CSV.
+    Returns False if sidecar can't be updated, it is stale then.
+    """
+    if pa is None or not os.path.isfile(sidecar_path(path)):
+        return False
+
+    target = sidecar_path(path)
+    temporary = target + '.part'
+    metadata = _source_metadata(path)
+    try:
+        source = pq.ParquetFile(target)
+        reader = _open_csv(delta_path)
+        schema = source.schema_arrow.with_metadata(metadata)
+        with pq.ParquetWriter(temporary, schema) as writer:
+            for batch in source.iter_batches():
+                writer.write_table(pa.Table.from_batches([batch]).replace_schema_metadata(metadata))
+            for batch in reader:
+                writer.write_table(pa.Table.from_batches([batch]).select(schema.names).cast(schema))
+        os.replace(temporary, target)
+    except (OSError, pa.ArrowException):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False
+
+    return True
+
+
+def remove_derived(path: str) -> None:
+    """
+    Remove all files derived from dataset stored in "path"
+    """
+    for suffix in DERIVED_SUFFIXES:
+        if os.path.isfile(derived_path(path, suffix)):
+            os.remove(derived_path(path, suffix))
+
+
+def count_rows(path: str) -> int:
+    """
+    Number of rows in dataset: from sidecar metadata if it is fresh,
+    otherwise number of lines in CSV except header
+    """
+    if is_sidecar_fresh(path):
+        return pq.ParquetFile(sidecar_path(path)).metadata.num_rows
+
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as file:
+        while block := file.read(1024 * 1024):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _from_arrow(table) -> pd.DataFrame:
+    df = table.to_pandas()
+    # Missing strings are None in Arrow but NaN in pd.read_csv
+    for column in df.columns:
+        if df[column].dtype == object and df[column].isna().any():
+            df[column] = df[column].fillna(np.nan)
+    return df
+
+
+def read_columns(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Read "columns" (all if None) of dataset stored in "path".
+    Uses Parquet sidecar if it is fresh, otherwise parses CSV.
+    Columns are cast to declared types (see app.booking.schema).
+    """
+    if not is_sidecar_fresh(path):
+        return apply_schema(read_csv(path, columns))
+
+    return apply_schema(_from_arrow(pq.read_table(sidecar_path(path), columns=columns)))
+
+
+def iter_chunks(path: str, columns: list[str] | None = None, chunk_size: int = 100_000) -> Iterator[pd.DataFrame]:
+    """
+    Read dataset stored in "path" by chunks of "chunk_size" rows.
+    Index of chunks continues through the file as in pd.read_csv(chunksize=...).
+    Columns are cast to declared types, categories of chunks may differ.
+    """
+    if not is_sidecar_fresh(path):
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+            yield apply_schema(chunk)
+        return
+
+    start = 0
+    for batch in pq.ParquetFile(sidecar_path(path)).iter_batches(batch_size=chunk_size, columns=columns):
+        chunk = _from_arrow(pa.Table.from_batches([batch]))
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield apply_schema(chunk)
@@ -0,0 +1,120 @@
+import pandas as pd
+
+from app.booking.cache import dataframe_cache
+from app.booking.columnar import CUBE_SUFFIX
+from app.booking.columnar import is_derived_fresh
+from app.booking.columnar import read_columns
+from app.booking.columnar import read_derived
+from app.booking.columnar import write_derived
+from app.booking.dates import DATE_COLUMNS
+from app.booking.dates import booking_dates
+from app.booking.streaming import chunks
+from app.booking.streaming import is_large
+from app.metrics import span
+
+# Dimensions and measures of aggregate cube. Arrival month is kept as name (as in dataset),
+# booking year and month are numbers.
+CUBE_DIMENSIONS = ['hotel', 'arrival_year', 'arrival_month', 'booking_year', 'booking_month',
+                   'country', 'meal', 'is_repeated_guest', 'is_canceled']
+CATEGORICAL_DIMENSIONS = ['hotel', 'arrival_month', 'country', 'meal']
+CUBE_MEASURES = ['bookings', 'adr_count', 'adr_sum', 'revenue_sum', 'stay_sum', 'guests_sum']
+
+# Columns of dataset necessary for building cube
+SOURCE_COLUMNS = DATE_COLUMNS + ['hotel', 'country', 'meal', 'is_repeated_guest', 'is_canceled', 'adr',
+                                 'stays_in_week_nights', 'stays_in_weekend_nights', 'adults', 'children', 'babies']
+
+
+def cube_facts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Dimensions and measures of each booking in dataset "df"
+    """
+    dates = booking_dates(df)
+    total_stay = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
+
+    return pd.DataFrame({'hotel': df['hotel'],
+                         'arrival_year': df['arrival_date_year'],
+                         'arrival_month': df['arrival_date_month'],
+                         'booking_year': dates['booking_year'],
+                         'booking_month': dates['booking_month'],
+                         'country': df['country'],
+                         'meal': df['meal'],
+                         'is_repeated_guest': df['is_repeated_guest'],
+                         'is_canceled': df['is_canceled'],
+                         'bookings': 1,
+                         'adr_count': df['adr'].notna().astype('int64'),
+                         'adr_sum': df['adr'],
+                         'revenue_sum': df['adr'] * total_stay,
+                         'stay_sum': total_stay,
+                         'guests_sum': df[['adults', 'children', 'babies']].sum(axis=1)})
+
+
+def aggregate(facts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum measures over unique combinations of dimensions. Missing values of dimensions
+    are kept as separate group, so totals over other dimensions are exact.
+    String dimensions are categorical: group them with observed=True.
+    """
+    with span('groupby'):
+        cube = facts.groupby(CUBE_DIMENSIONS, dropna=False, sort=False, observed=True)[CUBE_MEASURES].sum()
+        cube = cube.reset_index()
+        for column in CATEGORICAL_DIMENSIONS:
+            cube[column] = cube[column].astype('category')
+        return cube
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    return aggregate(cube_facts(df))
+
+
+def append_cube(cube: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cube of dataset after rows "delta" have been appended to it
+    """
+    # Cube of no rows has no types, concatenation would turn measures to objects
+    if delta.empty:
+        return cube
+    return aggregate(pd.concat([cube, build_cube(delta)], ignore_index=True))
+
+
+def build_cube_by_chunks(path: str) -> pd.DataFrame:
+    """
+    Cube of dataset stored in "path" combined from cubes of its chunks
+    """
+    return aggregate(pd.concat([build_cube(chunk) for chunk in chunks(path, SOURCE_COLUMNS)], ignore_index=True))
+
+
+def read_or_build_cube(path: str) -> pd.DataFrame:
+    """
+    Cube of dataset stored in "path": from derived file if it is fresh,
+    otherwise built from dataset and saved next to it (if directory is writable).
+    Cube of large dataset is combined from cubes of its chunks.
+    """
+    cube = read_derived(path, CUBE_SUFFIX)
+    if cube is None:
+        if is_large(path):
+            cube = build_cube_by_chunks(path)
+        else:
+            cube = build_cube(dataframe_cache.get(path, SOURCE_COLUMNS, loader=read_columns))
+        write_derived(cube, path, CUBE_SUFFIX)
+    return cube
+
+
+def write_cube(path: str) -> bool:
+    """
+    Build cube file of dataset stored in "path" in advance, if it is missing or stale.
+    It is built by chunks, which aren't kept in cache: analytics workers load dataset themselves.
+    Returns False if cube can't be built (e.g. dataset has invalid values),
+    analysis tries to build it on first read then.
+    """
+    if is_derived_fresh(path, CUBE_SUFFIX):
+        return True
+    try:
+        write_derived(build_cube_by_chunks(path), path, CUBE_SUFFIX)
+    except Exception:
+        return False
+    return True
+
+
+def load_cube(path: str) -> pd.DataFrame:
+    with span('cube'):
+        return dataframe_cache.derived(path, 'cube', read_or_build_cube)
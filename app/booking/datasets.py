@@ -0,0 +1,109 @@
+"""
+Partitions of "booking" table.
+
+Each load of a csv file by a user writes bookings of a new dataset. It becomes active
+dataset of the user in the same transaction which has filled it, so readers see either
+the previous dataset or the complete new one, and loads of different users don't
+touch each other's bookings. Replaced datasets are retired and dropped in background
+after DATASET_DROP_DELAY seconds: processes serving cached users (see app.user.cache)
+keep reading the previous dataset until their cache expires.
+"""
+import datetime
+import os
+from enum import Enum
+
+from sqlalchemy import Select
+from sqlalchemy import delete
+from sqlalchemy import false
+from sqlalchemy import insert
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.user.cache import USER_CACHE_TTL
+from models.models import booking
+from models.models import dataset
+from models.models import user
+
+# Bookings of retired dataset are deleted by batches, each in its own short transaction
+DATASET_DROP_BATCH_SIZE = int(os.getenv('DATASET_DROP_BATCH_SIZE', '50000'))
+# Seconds retired dataset is kept for readers, never less than lifetime of cached user
+DATASET_DROP_DELAY = max(float(os.getenv('DATASET_DROP_DELAY', '300')), USER_CACHE_TTL)
+
+
+class DatasetStatus(str, Enum):
+    loading = "loading"
+    active = "active"
+    retired = "retired"
+
+
+def dataset_bookings(dataset_id: int | None, *columns) -> Select:
+    """
+    Select "columns" (all if none) of bookings of dataset. User without dataset has no bookings.
+    """
+    stmt = select(*columns) if columns else select(booking)
+    if dataset_id is None:
+        return stmt.where(false())
+    return stmt.where(booking.c.dataset_id == dataset_id)
+
+
+async def create_dataset(session: AsyncSession, filename: str, user_id: int) -> int:
+    result = await session.execute(insert(dataset).values(filename=filename,
+                                                          user_id=user_id,
+                                                          status=DatasetStatus.loading.value,
+                                                          # Filled by app.booking.ingestion
+                                                          has_analytic_columns=True,
+                                                          created_at=datetime.datetime.utcnow()))
+    return result.inserted_primary_key[0]
+
+
+async def activate_dataset(session: AsyncSession, dataset_id: int, user_id: int) -> None:
+    """
+    Make dataset active dataset of user, set file of dataset as file for analysis of user
+    and retire the previous dataset. Takes effect on commit of "session"
+    """
+    await session.execute(update(dataset).where(dataset.c.user_id == user_id,
+                                                dataset.c.status == DatasetStatus.active.value)
+                          .values(status=DatasetStatus.retired.value, retired_at=datetime.datetime.utcnow()))
+    await session.execute(update(dataset).where(dataset.c.id == dataset_id)
+                          .values(status=DatasetStatus.active.value))
+    filename = select(dataset.c.filename).where(dataset.c.id == dataset_id).scalar_subquery()
+    await session.execute(update(user).where(user.c.id == user_id)
+                          .values(csvfile=filename, dataset_id=dataset_id))
+
+
+async def user_dataset(session: AsyncSession, user_id: int) -> tuple[str | None, int | None]:
+    """
+    File for analysis and active dataset of user as they are in database
+    """
+    csvfile, dataset_id = (await session.execute(select(user.c.csvfile, user.c.dataset_id)
+                                                 .where(user.c.id == user_id))).one()
+    return csvfile, dataset_id
+
+
+async def drop_retired_datasets(session_maker: async_sessionmaker, delay: float = DATASET_DROP_DELAY) -> None:
+    """
+    Delete bookings of datasets retired at least "delay" seconds ago and the datasets themselves
+    """
+    retired_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=delay)
+    async with session_maker() as session:
+        retired = (await session.scalars(select(dataset.c.id)
+                                         .where(dataset.c.status == DatasetStatus.retired.value,
+                                                or_(dataset.c.retired_at.is_(None),
+                                                    dataset.c.retired_at <= retired_before)))).all()
+
+        for dataset_id in retired:
+            while True:
+                ids = select(booking.c.id).where(booking.c.dataset_id == dataset_id) \
+                    .order_by(booking.c.id).limit(DATASET_DROP_BATCH_SIZE)
+                ids = (await session.scalars(ids)).all()
+                if not ids:
+                    break
+                await session.execute(delete(booking).where(booking.c.dataset_id == dataset_id,
+                                                            booking.c.id.between(ids[0], ids[-1])))
+                await session.commit()
+
+            await session.execute(delete(dataset).where(dataset.c.id == dataset_id))
+            await session.commit()
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from app.metrics import span
+
+# English names are used in datasets regardless of server locale
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Columns of dataset necessary for computing dates
+DATE_COLUMNS = ['arrival_date_year', 'arrival_date_month', 'arrival_date_day_of_month', 'lead_time']
+
+
+def month_numbers(months: pd.Series) -> np.ndarray:
+    """
+    Map month names to numbers 1..12 through lookup table.
+    Raises ValueError for unknown or missing names, as strptime does
+    """
+    codes = pd.Categorical(months, categories=MONTH_NAMES).codes.astype(np.int64)
+    if (codes < 0).any():
+        raise ValueError(f'Unknown month name: {np.asarray(months)[np.argmax(codes < 0)]!r}')
+    return codes + 1
+
+
+def month_names(numbers) -> np.ndarray:
+    return np.array(MONTH_NAMES, dtype=object)[np.asarray(numbers) - 1]
+
+
+def day_names(numbers) -> np.ndarray:
+    return np.array(DAY_NAMES, dtype=object)[np.asarray(numbers)]
+
+
+def arrival_dates(df: pd.DataFrame) -> np.ndarray:
+    """
+    Arrival date as datetime64[D] array from "arrival_date_..." columns.
+    Raises ValueError for days out of range of their month, as strptime does
+    """
+    years = np.asarray(df['arrival_date_year'], dtype=np.int64) - 1970
+    months = month_numbers(df['arrival_date_month']) - 1
+    days = np.asarray(df['arrival_date_day_of_month'], dtype=np.int64) - 1
+
+    month_starts = years.astype('datetime64[Y]').astype('datetime64[M]') + months.astype('timedelta64[M]')
+    month_lengths = ((month_starts + 1).astype('datetime64[D]') - month_starts.astype('datetime64[D]')).astype(np.int64)
+    invalid = (days < 0) | (days >= month_lengths)
+    if invalid.any():
+        row = np.argmax(invalid)
+        raise ValueError(f'Day {days[row] + 1} is out of range for month {month_starts[row]}')
+
+    return month_starts.astype('datetime64[D]') + days.astype('timedelta64[D]')
+
+
+def arrival_weekdays(df: pd.DataFrame) -> np.ndarray:
+    """
+    Weekday of arrival, 0 is Monday
+    """
+    with span('dates'):
+        # 1970-01-01 is Thursday
+        return (arrival_dates(df).astype(np.int64) + 3) % 7
+
+
+def booking_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute in one pass for each row of dataset:
+    arrival_date, booking_date (arrival minus lead_time days) as datetime64,
+    booking_year, booking_month (1..12) and weekday of arrival (0 is Monday).
+    Index of result is the same as index of "df".
+    """
+    with span('dates'):
+        arrival = arrival_dates(df)
+        booking = arrival - np.asarray(df['lead_time'], dtype=np.int64).astype('timedelta64[D]')
+
+        booking_month = booking.astype('datetime64[M]').astype(np.int64)
+
+        return pd.DataFrame({'arrival_date': arrival.astype('datetime64[ns]'),
+                             'booking_date': booking.astype('datetime64[ns]'),
+                             'booking_year': booking_month // 12 + 1970,
+                             'booking_month': booking_month % 12 + 1,
+                             'arrival_weekday': (arrival.astype(np.int64) + 3) % 7},
+                            index=df.index)
@@ -0,0 +1,228 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.booking.cache import dataframe_cache
+from app.booking.cache import enable_copy_on_write
+from app.booking.cache import file_key
+from app.booking.locks import dataset_lock
+from app.metrics import call_with_spans
+from app.metrics import record_spans
+from app.serialization import call_serialized
+
+# Number of worker processes for analytics. 0 runs computations in thread pool of the API process
+ANALYTICS_WORKERS = int(os.getenv('ANALYTICS_WORKERS', '2'))
+# Default number of concurrent computations of one endpoint,
+# can be set for each endpoint by ANALYTICS_CONCURRENCY_<NAME>, e.g. ANALYTICS_CONCURRENCY_ANALYSIS=1
+ANALYTICS_CONCURRENCY = int(os.getenv('ANALYTICS_CONCURRENCY', '4'))
+# Seconds of computation before request for analysis fails with 504 error
+ANALYTICS_TIMEOUT = float(os.getenv('ANALYTICS_TIMEOUT', '60'))
+
+
+def _init_worker(cache_budget: int) -> None:
+    enable_copy_on_write()
+    dataframe_cache.memory_budget = cache_budget
+
+
+def _call(func: Callable, path: str, *args) -> tuple[bytes | None, list, dict]:
+    """
+    JSON of func(path, *args), spans recorded by it and statistics of dataset cache of the process.
+    Dataset isn't appended to while it is read.
+    """
+    with dataset_lock(path):
+        result, spans = call_with_spans(call_serialized, func, path, *args)
+    return result, spans, dataframe_cache.stats()
+
+
+def _invalidate(path: str) -> dict:
+    dataframe_cache.invalidate(path)
+    return dataframe_cache.stats()
+
+
+class AnalyticsExecutor:
+    """
+    Runs pandas computations of analytics endpoints outside of the event loop.
+
+    With "workers" > 0 computations are executed in worker processes, so they don't
+    compete for GIL with the API process. Each worker is a pool of one process:
+    a job is sent to an idle worker, and updates of caches (invalidation of file,
+    appended rows) reach every worker. Workers keep own dataset caches, sharing DATAFRAME_CACHE_BUDGET,
+    and report statistics of their caches with results.
+
+    Identical concurrent requests (same endpoint, dataset version and parameters)
+    are coalesced: computed once, the result is shared by all of them. Cancelled request
+    doesn't cancel computation awaited by others. Timeout starts when job is sent to worker;
+    timed out job keeps its worker and its slot of endpoint until it finishes.
+    Results are encoded to JSON where they are computed. Spans recorded by computation
+    (see app.metrics) are passed back and added to timings of each request.
+    """
+
+    def __init__(self,
+                 workers: int = ANALYTICS_WORKERS,
+                 concurrency: int = ANALYTICS_CONCURRENCY,
+                 timeout: float = ANALYTICS_TIMEOUT):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._pools: list[ProcessPoolExecutor] = []
+        self._idle: asyncio.Queue | None = None
+        self._cache_stats: dict[int, dict] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+
+    async def run(self, name: str, func: Callable, path: str, *args) -> bytes | None:
+        """
+        JSON of func(path, *args) computed for endpoint "name", None if function has returned None
+        """
+        key = (name, file_key(path), args)
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(name, func, path, *args))
+            self._in_flight[key] = task
+
+            def forget(done: asyncio.Task) -> None:
+                if self._in_flight.get(key) is done:
+                    del self._in_flight[key]
+
+            task.add_done_callback(forget)
+            # Exception is retrieved by waiters, if there are no waiters it mustn't be reported as lost
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        # Computation goes on if this request is cancelled, other requests may wait for it
+        result, spans = await asyncio.shield(task)
+        record_spans(spans)
+        return result
+
+    def invalidate(self, path: str) -> None:
+        """
+        Drop cached columns of file "path" in the API process and in all workers
+        """
+        dataframe_cache.invalidate(path)
+        self._broadcast(_invalidate, path)
+
+    async def update_caches(self, func: Callable, *args) -> None:
+        """
+        Call func(*args), which updates dataset cache and returns its statistics,
+        in the API process and in all workers (after jobs already sent to them)
+        """
+        await run_in_threadpool(func, *args)
+        self._broadcast(func, *args)
+
+    def cache_stats(self) -> dict:
+        """
+        Statistics of dataset caches of workers (as of their last jobs) summed,
+        statistics of cache of the API process without workers
+        """
+        if self.workers <= 0:
+            return dataframe_cache.stats()
+        stats = {name: 0 for name in dataframe_cache.stats()}
+        for worker_stats in list(self._cache_stats.values()):
+            for name, value in worker_stats.items():
+                stats[name] += value
+        stats['memory_budget'] = dataframe_cache.memory_budget
+        return stats
+
+    def shutdown(self) -> None:
+        for pool in self._pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools = []
+        self._idle = None
+
+    def _limit(self, name: str) -> asyncio.Semaphore:
+        if name not in self._limits:
+            limit = int(os.getenv(f'ANALYTICS_CONCURRENCY_{name.upper()}', self.concurrency))
+            self._limits[name] = asyncio.Semaphore(limit)
+        return self._limits[name]
+
+    async def _compute(self, name: str, func: Callable, *args) -> tuple[bytes | None, list]:
+        limit = self._limit(name)
+        await limit.acquire()
+        try:
+            worker = await self._acquire_worker()
+        except BaseException:
+            limit.release()
+            raise
+
+        future = self._submit(worker, func, *args)
+
+        def release(done: asyncio.Future) -> None:
+            if worker is not None and self._pools:
+                if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                    # Worker process has died (e.g. killed for memory), only its job fails
+                    self._replace(worker)
+                self._idle.put_nowait(worker)
+            limit.release()
+
+        future.add_done_callback(release)
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        try:
+            result, spans, cache_stats = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504,
+                                detail="Analysis is taking too long. Try again later")
+        except BrokenProcessPool:
+            raise HTTPException(status_code=500,
+                                detail="Analysis has failed. Try again or ask your system administrator for help")
+        if worker is not None:
+            self._cache_stats[worker] = cache_stats
+        return result, spans
+
+    async def _acquire_worker(self) -> int | None:
+        """
+        Index of idle worker, None without workers
+        """
+        if self.workers <= 0:
+            return None
+        if not self._pools:
+            self._start()
+        return await self._idle.get()
+
+    def _start(self) -> None:
+        self._pools = [self._new_pool() for _ in range(self.workers)]
+        self._idle = asyncio.Queue()
+        for worker in range(self.workers):
+            self._idle.put_nowait(worker)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # "spawn" doesn't copy threads and connections of the API process to workers
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker,
+                                   initargs=(dataframe_cache.memory_budget // self.workers,))
+
+    def _replace(self, worker: int) -> None:
+        """
+        Replace broken pool of worker by a new one, its cache is gone with the process
+        """
+        self._pools[worker].shutdown(wait=False, cancel_futures=True)
+        self._pools[worker] = self._new_pool()
+        self._cache_stats.pop(worker, None)
+
+    def _submit(self, worker: int | None, func: Callable, *args) -> asyncio.Future:
+        if worker is None:
+            return asyncio.ensure_future(run_in_threadpool(_call, func, *args))
+        return asyncio.get_running_loop().run_in_executor(self._pools[worker], _call, func, *args)
+
+    def _broadcast(self, func: Callable, *args) -> None:
+        """
+        Call func(*args) returning statistics of dataset cache in every started worker,
+        after jobs already sent to it. Workers which aren't started yet have nothing cached
+        """
+        for worker, pool in enumerate(self._pools):
+            pool.submit(func, *args).add_done_callback(partial(self._update_cache_stats, worker))
+
+    def _update_cache_stats(self, worker: int, future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self._cache_stats[worker] = future.result()
+
+
+analytics_executor = AnalyticsExecutor()
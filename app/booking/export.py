@@ -0,0 +1,118 @@
+"""
+Streaming export of bookings in CSV, NDJSON and Arrow IPC stream formats.
+
+Rows are read by server-side cursor in partitions of EXPORT_CHUNK_SIZE rows and
+each partition is encoded and sent before the next one is read, so memory usage
+doesn't depend on size of result.
+"""
+import csv
+import io
+import os
+from enum import Enum
+from typing import AsyncIterator
+from typing import Callable
+
+import orjson
+
+from app.booking.datasets import dataset_bookings
+from app.booking.fulltext import has_fulltext
+from app.booking.search import SearchParams
+from app.database import read_session_maker
+from models.models import booking
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '10000'))
+
+COLUMNS = ['id', 'booking_date', 'length_of_stay', 'guest_name', 'daily_rate']
+
+
+class ExportFormat(Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    arrow = "arrow"
+
+
+MEDIA_TYPES = {ExportFormat.csv: 'text/csv',
+               ExportFormat.ndjson: 'application/x-ndjson',
+               ExportFormat.arrow: 'application/vnd.apache.arrow.stream'}
+
+# End-of-stream marker of Arrow IPC stream format
+ARROW_EOS = b'\xff\xff\xff\xff\x00\x00\x00\x00'
+
+
+def negotiate_format(accept: str | None) -> ExportFormat:
+    """
+    The first of supported formats listed in Accept header, CSV by default
+    """
+    for media_range in (accept or '').split(','):
+        media_type = media_range.split(';')[0].strip().lower()
+        for export_format, format_media_type in MEDIA_TYPES.items():
+            if media_type == format_media_type:
+                return export_format
+    return ExportFormat.csv
+
+
+def is_supported(export_format: ExportFormat) -> bool:
+    return export_format != ExportFormat.arrow or pa is not None
+
+
+def csv_rows(rows: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def ndjson_rows(rows: list) -> bytes:
+    return b''.join(orjson.dumps(dict(zip(COLUMNS, row))) + b'\n' for row in rows)
+
+
+def arrow_schema():
+    return pa.schema([('id', pa.int64()),
+                      ('booking_date', pa.date32()),
+                      ('length_of_stay', pa.int64()),
+                      ('guest_name', pa.string()),
+                      ('daily_rate', pa.float64())])
+
+
+def arrow_rows(rows: list) -> bytes:
+    schema = arrow_schema()
+    batch = pa.RecordBatch.from_arrays([pa.array(column, type=field.type)
+                                        for column, field in zip(zip(*rows), schema)],
+                                       schema=schema)
+    return batch.serialize().to_pybytes()
+
+
+def encoding(export_format: ExportFormat) -> tuple[bytes, Callable[[list], bytes], bytes]:
+    """
+    (header, encoder of rows, footer) of format
+    """
+    if export_format == ExportFormat.arrow:
+        return arrow_schema().serialize().to_pybytes(), arrow_rows, ARROW_EOS
+    if export_format == ExportFormat.ndjson:
+        return b'', ndjson_rows, b''
+    return csv_rows([COLUMNS]), csv_rows, b''
+
+
+async def export_bookings(dataset_id: int | None, params: SearchParams,
+                          export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """
+    Bookings of dataset matching "params" ordered by id, encoded in "export_format" by chunks
+    """
+    header, encode, footer = encoding(export_format)
+
+    # Stream has its own session which lives as long as the response
+    async with read_session_maker() as session:
+        fulltext = await has_fulltext(session)
+        stmt = dataset_bookings(dataset_id, *[booking.c[column] for column in COLUMNS])
+        stmt = params.where(stmt, fulltext).order_by(params.id_column(fulltext))
+
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+        yield header
+        async for rows in result.partitions():
+            yield encode(rows)
+        yield footer
@@ -0,0 +1,43 @@
+"""
+Full-text index of guest names: SQLite FTS5 table over "booking" table.
+
+The index is external-content (it doesn't store names twice) and is kept in sync
+with "booking" table by triggers, both are created with the table (models/models.py).
+Other databases have no such table, search falls back to prefix LIKE there.
+"""
+import re
+
+from sqlalchemy import column
+from sqlalchemy import table
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+FULLTEXT_TABLE = 'booking_fts'
+
+# rowid of the index is id of booking
+booking_fts = table(FULLTEXT_TABLE, column('rowid'), column(FULLTEXT_TABLE))
+
+# Presence of the index by URL of database, it is looked up once per process
+_has_fulltext: dict[str, bool] = {}
+
+
+async def has_fulltext(session: AsyncSession) -> bool:
+    if session.bind.dialect.name != 'sqlite':
+        return False
+    url = str(session.bind.url)
+    if url not in _has_fulltext:
+        result = await session.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                                       {'name': FULLTEXT_TABLE})
+        _has_fulltext[url] = result.first() is not None
+    return _has_fulltext[url]
+
+
+def match_query(words: str) -> str | None:
+    """
+    FTS5 query matching names which contain all words of "words" as prefixes of their words,
+    e.g. "ern bar" matches "Ernest Barnes". None if there are no words.
+    """
+    tokens = re.findall(r'\w+', words)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
@@ -0,0 +1,168 @@
+import os
+import time
+from itertools import chain
+from typing import Callable
+
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.booking.columnar import iter_chunks
+from app.booking.dates import DATE_COLUMNS
+from app.booking.dates import booking_dates
+from app.metrics import span
+from models.models import booking
+
+INGESTION_CHUNK_SIZE = int(os.getenv('INGESTION_CHUNK_SIZE', '50000'))
+# Rows per batch of INSERT or COPY. Parameters are processed on the event loop,
+# so smaller batches keep API responsive during ingestion
+INGESTION_BATCH_SIZE = int(os.getenv('INGESTION_BATCH_SIZE', '5000'))
+# Limit of bound parameters of a statement in SQLite 3.32+
+SQLITE_MAX_VARIABLES = 32766
+
+# Columns of dataset copied to "booking" table as they are (analytic columns)
+ANALYTIC_COLUMNS = ['hotel', 'country', 'meal', 'is_canceled', 'is_repeated_guest', 'adults', 'children', 'babies']
+# Columns of dataset necessary for filling "booking" table
+SOURCE_COLUMNS = DATE_COLUMNS + ['stays_in_week_nights', 'stays_in_weekend_nights', 'name', 'adr'] + ANALYTIC_COLUMNS
+# Columns of "booking" table filled from dataset
+BOOKING_COLUMNS = ['booking_date', 'length_of_stay', 'guest_name', 'daily_rate', 'dataset_id',
+                   *ANALYTIC_COLUMNS, 'arrival_year', 'arrival_month', 'booking_year', 'booking_month']
+
+
+def _values(column: pd.Series) -> list:
+    """
+    Python objects instead of numpy scalars, None instead of NaN
+    """
+    missing = column.isna()
+    if missing.any():
+        return column.astype(object).where(~missing, None).tolist()
+    return column.tolist()
+
+
+def booking_columns(df: pd.DataFrame, dataset_id: int) -> list[list]:
+    """
+    Transform chunk of dataset to values of BOOKING_COLUMNS of "booking" table
+    """
+    dates = booking_dates(df)
+    # Number of children is float in dataset because of missing values
+    df = df.assign(children=df['children'].astype('Int64'))
+
+    return [dates['booking_date'].to_numpy().astype('datetime64[D]').tolist(),
+            _values(df['stays_in_week_nights'] + df['stays_in_weekend_nights']),
+            _values(df['name']),
+            _values(df['adr']),
+            [dataset_id] * len(df),
+            *[_values(df[column]) for column in ANALYTIC_COLUMNS],
+            _values(df['arrival_date_year']),
+            _values(df['arrival_date_month']),
+            dates['booking_year'].tolist(),
+            dates['booking_month'].tolist()]
+
+
+def booking_rows(df: pd.DataFrame, dataset_id: int) -> list[dict]:
+    """
+    Transform chunk of dataset to rows of "booking" table
+    """
+    return [dict(zip(BOOKING_COLUMNS, values)) for values in zip(*booking_columns(df, dataset_id))]
+
+
+def booking_records(df: pd.DataFrame, dataset_id: int, iso_dates: bool = False) -> list[tuple]:
+    """
+    Transform chunk of dataset to tuples of values of BOOKING_COLUMNS.
+    With "iso_dates" dates are strings as SQLite stores them.
+    """
+    columns = booking_columns(df, dataset_id)
+    if iso_dates:
+        columns[0] = [None if date is None else date.isoformat() for date in columns[0]]
+    return list(zip(*columns))
+
+
+def _next_rows(chunks, dataset_id: int, copy: bool, multirow: bool) -> list | None:
+    chunk = next(chunks, None)
+    if chunk is None:
+        return None
+    if copy or multirow:
+        return booking_records(chunk, dataset_id, iso_dates=multirow)
+    return booking_rows(chunk, dataset_id)
+
+
+def supports_copy(session: AsyncSession) -> bool:
+    return session.bind.dialect.driver == 'asyncpg'
+
+
+def supports_multirow(session: AsyncSession) -> bool:
+    return session.bind.dialect.name == 'sqlite'
+
+
+async def copy_bookings(session: AsyncSession, records: list[tuple]) -> None:
+    """
+    Write records to "booking" table by COPY FROM STDIN (asyncpg) in the transaction of "session"
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(booking.name, records=records,
+                                                                 columns=BOOKING_COLUMNS)
+
+
+async def insert_bookings(session: AsyncSession, records: list[tuple]) -> None:
+    """
+    Write records to "booking" table by multi-row INSERT in the transaction of "session" (SQLite).
+    Full-text index (app/booking/fulltext.py) flushes its pending data at the end of each statement,
+    so it is filled by its trigger many times faster than by executemany of one row per statement.
+    """
+    connection = await session.connection()
+    columns = ', '.join(BOOKING_COLUMNS)
+    placeholders = '(' + ', '.join('?' * len(BOOKING_COLUMNS)) + ')'
+    size = SQLITE_MAX_VARIABLES // len(BOOKING_COLUMNS)
+    for i in range(0, len(records), size):
+        part = records[i:i + size]
+        await connection.exec_driver_sql(f'INSERT INTO {booking.name} ({columns}) VALUES '
+                                         + ', '.join([placeholders] * len(part)),
+                                         tuple(chain.from_iterable(part)))
+
+
+async def ingest_file(path: str,
+                      session: AsyncSession,
+                      dataset_id: int,
+                      chunk_size: int = INGESTION_CHUNK_SIZE,
+                      progress: Callable[[int], None] | None = None) -> dict:
+    """
+    Add bookings of dataset stored in "path" to "booking" table as bookings of dataset "dataset_id"
+    (see app.booking.datasets).
+
+    File is streamed by chunks of "chunk_size" rows, reading and transforming of chunks
+    are done in thread pool, rows are written in batches by COPY in PostgreSQL,
+    by multi-row INSERT in SQLite and by executemany INSERT in other databases.
+    All statements are executed in the transaction of "session", commit is up to caller.
+    Full-text index of guest names is updated by triggers (see app.booking.fulltext).
+    "progress" is called with number of rows written so far after each chunk.
+    """
+    start = time.perf_counter()
+    count = 0
+
+    copy = supports_copy(session)
+    multirow = supports_multirow(session)
+    chunks = iter_chunks(path, SOURCE_COLUMNS, chunk_size)
+    while True:
+        with span('ingest_read'):
+            rows = await run_in_threadpool(_next_rows, chunks, dataset_id, copy, multirow)
+        if rows is None:
+            break
+        with span('ingest_insert'):
+            for i in range(0, len(rows), INGESTION_BATCH_SIZE):
+                if copy:
+                    await copy_bookings(session, rows[i:i + INGESTION_BATCH_SIZE])
+                elif multirow:
+                    await insert_bookings(session, rows[i:i + INGESTION_BATCH_SIZE])
+                else:
+                    await session.execute(insert(booking), rows[i:i + INGESTION_BATCH_SIZE])
+        count += len(rows)
+        if progress is not None:
+            progress(count)
+
+    seconds = time.perf_counter() - start
+
+    return {'rows': count,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(count / seconds) if seconds else count}
@@ -0,0 +1,73 @@
+"""
+Locks of dataset files, shared by processes of the host: API processes and analytics workers.
+
+Readers of a dataset (analytics, ingestion job) hold shared lock of its file, appends
+hold exclusive lock, so the file and its derived files are never read in the middle of append.
+Locks are advisory (flock) and kept in hidden files next to datasets.
+Without fcntl (e.g. on Windows) files aren't locked.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from app.booking.columnar import derived_path
+
+LOCK_SUFFIX = '.lock'
+# Seconds between attempts to take lock without blocking event loop
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _mode(exclusive: bool) -> int:
+    return fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+
+def _open(path: str):
+    """
+    Lock file of dataset, None if fcntl is unavailable or directory of dataset is read-only
+    (such dataset, e.g. demo file, can't be appended to either)
+    """
+    if fcntl is None:
+        return None
+    try:
+        return open(derived_path(path, LOCK_SUFFIX), 'a')
+    except OSError:
+        return None
+
+
+@contextmanager
+def dataset_lock(path: str, exclusive: bool = False):
+    """
+    Lock of dataset stored in "path", waits for it blocking the thread
+    """
+    file = _open(path)
+    if file is None:
+        yield
+        return
+    # Lock is released when file is closed
+    with file:
+        fcntl.flock(file, _mode(exclusive))
+        yield
+
+
+@asynccontextmanager
+async def async_dataset_lock(path: str, exclusive: bool = False):
+    """
+    Lock of dataset stored in "path" for coroutines, waits for it without blocking event loop
+    """
+    file = _open(path)
+    if file is None:
+        yield
+        return
+    with file:
+        while True:
+            try:
+                fcntl.flock(file, _mode(exclusive) | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+        yield
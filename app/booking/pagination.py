@@ -0,0 +1,97 @@
+import base64
+import binascii
+import datetime
+import json
+import os
+from enum import Enum
+
+from fastapi import HTTPException
+from sqlalchemy import ColumnElement
+from sqlalchemy import Select
+from sqlalchemy import and_
+from sqlalchemy import or_
+
+from models.models import booking
+
+# Default and maximum number of bookings in one page
+BOOKINGS_PAGE_SIZE = int(os.getenv('BOOKINGS_PAGE_SIZE', '10'))
+BOOKINGS_PAGE_SIZE_MAX = int(os.getenv('BOOKINGS_PAGE_SIZE_MAX', '1000'))
+
+
+class OrderBy(Enum):
+    id = "id"
+    booking_date = "booking_date"
+    daily_rate = "daily_rate"
+
+
+def encode_cursor(order_by: OrderBy, row) -> str:
+    """
+    Opaque cursor pointing after "row": ordering, value of ordering column and id
+    """
+    value = getattr(row, order_by.value)
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    data = json.dumps([order_by.value, value, row.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, order_by: OrderBy) -> tuple:
+    """
+    (value of ordering column, id) stored in cursor. Raises 400 error if cursor is
+    malformed or has been issued for another ordering.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        order, value, last_id = json.loads(data)
+        if order != order_by.value or not isinstance(last_id, int):
+            raise ValueError
+        if order_by == OrderBy.booking_date and value is not None:
+            value = datetime.date.fromisoformat(value)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400,
+                            detail="Invalid cursor")
+    return value, last_id
+
+
+def keyset_page(stmt: Select, order_by: OrderBy, cursor: str | None, limit: int,
+                id_column: ColumnElement = booking.c.id) -> Select:
+    """
+    Page of "stmt" ordered by (order_by, id) which starts after cursor.
+    One extra row is selected to find out whether there is a next page.
+    Empty values of ordering column go first, as in SQLite.
+    "id_column" is a column equal to id of booking which constraints and ordering
+    by id are applied to, e.g. rowid of joined index.
+    """
+    if order_by == OrderBy.id:
+        if cursor is not None:
+            _, last_id = decode_cursor(cursor, order_by)
+            stmt = stmt.where(id_column > last_id)
+        return stmt.order_by(id_column).limit(limit + 1)
+
+    column = booking.c[order_by.value]
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, order_by)
+        if value is None:
+            stmt = stmt.where(or_(and_(column.is_(None), id_column > last_id),
+                                  column.is_not(None)))
+        else:
+            stmt = stmt.where(or_(column > value,
+                                  and_(column == value, id_column > last_id)))
+    return stmt.order_by(column.asc().nulls_first(), id_column).limit(limit + 1)
+
+
+def booking_item(row) -> dict:
+    return {'id': row.id,
+            'booking_date': row.booking_date,
+            'length_of_stay': row.length_of_stay,
+            'guest_name': row.guest_name,
+            'daily_rate': row.daily_rate}
+
+
+def page_result(rows: list, order_by: OrderBy, limit: int) -> dict:
+    """
+    Response with bookings of page and cursor of the next page (None for the last page)
+    """
+    next_cursor = encode_cursor(order_by, rows[limit - 1]) if len(rows) > limit else None
+    return {'items': [booking_item(row) for row in rows[:limit]],
+            'next_cursor': next_cursor}
@@ -0,0 +1,157 @@
+"""
+Analytics endpoints of /bookings as SQL GROUP BY queries over "booking" table.
+
+Bookings of a dataset are ingested with their analytic columns (hotel, country, meal, ...),
+so results are computed by database instead of loading the file into worker memory.
+Results are the same as of app.booking.analytics. Datasets without analytic columns
+and demo file are analysed by pandas, as well as everything with ANALYTICS_SQL=0.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.booking.analytics import Type
+from app.booking.analytics import analysis_means_result
+from app.booking.datasets import dataset_bookings
+from app.booking.dates import month_names
+from app.metrics import span
+from models.models import booking
+from models.models import dataset
+
+# Results of cached dataset in memory are faster, SQL saves memory of workers
+ANALYTICS_SQL = os.getenv('ANALYTICS_SQL', '0') == '1'
+
+HOTELS = ['Resort Hotel', 'City Hotel']
+
+revenue = booking.c.daily_rate * booking.c.length_of_stay
+# Missing numbers of guests are skipped, as in sums of pandas
+guests = func.coalesce(booking.c.adults, 0) + func.coalesce(booking.c.children, 0) \
+    + func.coalesce(booking.c.babies, 0)
+
+
+async def analytic_dataset(session: AsyncSession, dataset_id: int | None) -> int | None:
+    """
+    "dataset_id" if analytics of the dataset are computed by SQL, otherwise None
+    """
+    if not ANALYTICS_SQL or dataset_id is None:
+        return None
+    return await session.scalar(select(dataset.c.id).where(dataset.c.id == dataset_id,
+                                                           dataset.c.has_analytic_columns))
+
+
+async def _rows(session: AsyncSession, stmt) -> list:
+    with span('sql'):
+        return (await session.execute(stmt)).all()
+
+
+def _round(value: float) -> float:
+    # Rounding of numpy, as Series.round
+    return float(np.round(value, 2))
+
+
+def _nested(rows) -> dict:
+    result = dict()
+    for key, inner_key, value in rows:
+        result.setdefault(key, {})[inner_key] = value
+    return result
+
+
+async def analysis(session: AsyncSession, dataset_id: int, is_canceled: bool, type_group: Type):
+    """
+    Mean revenue by booking or arrival month, grouped by year for each hotel
+    """
+    if type_group == Type.booking:
+        year, month = booking.c.booking_year, booking.c.booking_month
+    else:
+        year, month = booking.c.arrival_year, booking.c.arrival_month
+
+    stmt = dataset_bookings(dataset_id, booking.c.hotel, year, month, func.avg(revenue)) \
+        .where(booking.c.hotel.in_(HOTELS), year.is_not(None), month.is_not(None)) \
+        .group_by(booking.c.hotel, year, month)
+    if not is_canceled:
+        stmt = stmt.where(booking.c.is_canceled == 0)
+
+    means = pd.DataFrame(await _rows(session, stmt), columns=['hotel', 'year', 'month', 'total_revenue'])
+    means['total_revenue'] = means['total_revenue'].astype('float64')
+
+    return analysis_means_result(means, type_group)
+
+
+async def popular_meal_package(session: AsyncSession, dataset_id: int):
+    """
+    The most popular meal package
+    """
+    count = func.count()
+    stmt = dataset_bookings(dataset_id, booking.c.meal, count).where(booking.c.meal.is_not(None)) \
+        .group_by(booking.c.meal).order_by(count.desc(), booking.c.meal).limit(1)
+
+    return dict(await _rows(session, stmt))
+
+
+async def avg_length_of_stay(session: AsyncSession, dataset_id: int):
+    """
+    Average length of stay grouped by hotel type and booking year
+    """
+    stmt = dataset_bookings(dataset_id, booking.c.hotel, booking.c.booking_year,
+                            func.coalesce(func.sum(booking.c.length_of_stay), 0), func.count()) \
+        .where(booking.c.hotel.is_not(None), booking.c.booking_year.is_not(None)) \
+        .group_by(booking.c.hotel, booking.c.booking_year)
+
+    rows = sorted(await _rows(session, stmt))
+
+    return _nested((hotel, year, _round(stay / count)) for hotel, year, stay, count in rows)
+
+
+async def total_revenue(session: AsyncSession, dataset_id: int):
+    """
+    Total revenue grouped by hotel type and booking month
+    """
+    stmt = dataset_bookings(dataset_id, booking.c.hotel, booking.c.booking_month,
+                            func.coalesce(func.sum(revenue), 0.0)) \
+        .where(booking.c.hotel.is_not(None), booking.c.booking_month.is_not(None)) \
+        .group_by(booking.c.hotel, booking.c.booking_month)
+
+    rows = await _rows(session, stmt)
+    months = month_names([month for _, month, _ in rows]) if rows else []
+    rows = sorted((hotel, name, _round(total)) for (hotel, _, total), name in zip(rows, months))
+
+    return _nested(rows)
+
+
+async def top_countries(session: AsyncSession, dataset_id: int):
+    """
+    Top 5 countries with the highest number of bookings
+    """
+    count = func.count()
+    stmt = dataset_bookings(dataset_id, booking.c.country, count).where(booking.c.country.is_not(None)) \
+        .group_by(booking.c.country).order_by(count.desc(), booking.c.country).limit(5)
+
+    return {"data": dict(await _rows(session, stmt))}
+
+
+async def repeated_guests_percentage(session: AsyncSession, dataset_id: int):
+    """
+    Percentage of repeated guests among all bookings
+    """
+    stmt = dataset_bookings(dataset_id, func.count().filter(booking.c.is_repeated_guest == 1), func.count())
+    repeated, total = (await _rows(session, stmt))[0]
+
+    result = (repeated / total) * 100
+
+    return {"result": f'{result:.4f}'}
+
+
+async def total_guests_by_year(session: AsyncSession, dataset_id: int):
+    """
+    Total number of guests (adults, children, and babies) by arrival year
+    """
+    stmt = dataset_bookings(dataset_id, booking.c.arrival_year, func.sum(guests)) \
+        .where(booking.c.arrival_year.is_not(None)) \
+        .group_by(booking.c.arrival_year).order_by(booking.c.arrival_year)
+
+    # Number of children is float in dataset, so are sums of guests
+    return {year: float(total) for year, total in await _rows(session, stmt)}
@@ -2,28 +2,42 @@ import secrets
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import Header
 from fastapi import Response
 from fastapi import status
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.booking.utils import get_dataframe
-from app.booking.utils import date_from_columns
-from app.booking.utils import booking_date_month
-from app.booking.utils import booking_date_year
-from app.booking.utils import analysis_result
-from app.database import get_async_session
+from app.booking import analytics
+from app.booking import pushdown
+from app.booking.aggregate import AGGREGATE_MAX_GROUPS
+from app.booking.aggregate import AggregateParams
+from app.booking.aggregate import aggregate
+from app.booking.analytics import Type
+from app.booking.datasets import dataset_bookings
+from app.booking.executor import analytics_executor
+from app.booking.export import ExportFormat
+from app.booking.export import MEDIA_TYPES
+from app.booking.export import export_bookings
+from app.booking.export import is_supported
+from app.booking.export import negotiate_format
+from app.booking.fulltext import has_fulltext
+from app.booking.pagination import BOOKINGS_PAGE_SIZE
+from app.booking.pagination import BOOKINGS_PAGE_SIZE_MAX
+from app.booking.pagination import OrderBy
+from app.booking.pagination import keyset_page
+from app.booking.pagination import page_result
+from app.booking.search import SearchParams
+from app.booking.utils import dataset_path
+from app.booking.utils import DEMO_FILE
+from app.database import get_read_session
+from app.serialization import FastJSONResponse
 
 from app.user.config import fastapi_users
 from app.user.models import User
 
-import pandas as pd
-import numpy as np
-
 from models.models import booking
 
-from enum import Enum
-
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
 current_user = fastapi_users.current_user()
@@ -53,97 +67,91 @@ def verify_credentials(
     return True
 
 
+async def sql_dataset(session: AsyncSession = Depends(get_read_session),
+                      _user: User = Depends(current_user)) -> int | None:
+    """
+    Dataset of user if analytics are computed by SQL (see app.booking.pushdown), otherwise None
+    """
+    return await pushdown.analytic_dataset(session, _user.dataset_id)
+
+
 bookings_routes = APIRouter(
     prefix='/bookings',
     tags=['Analysis for bookings']
 )
 
 
-class Type(Enum):
-    booking = "booking"
-    arrival = "arrival"
-
-
 # 1. Retrieves a list of all bookings in the dataset.
-# !! Add pagination due to a lot of rows in db
+# Keyset pagination: cost of any page is the same as of the first one
 @bookings_routes.get('/',
                      summary='Retrieve a list of all bookings in the dataset using pagination',
-                     description='Retrieve a list of all bookings in the dataset from "start" position to "start+step"',
+                     description='Retrieve a page of "limit" bookings ordered by "order_by" (and id). '
+                                 'Pass "next_cursor" of response as "cursor" to get the next page, '
+                                 'it is null on the last page',
                      status_code=status.HTTP_200_OK
                      )
-async def get_all(start: int = Query(default=0, ge=0),
-                  step: int = Query(default=10, gt=0),
-                  session: AsyncSession = Depends(get_async_session),
+async def get_all(cursor: str | None = None,
+                  limit: int = Query(default=BOOKINGS_PAGE_SIZE, gt=0, le=BOOKINGS_PAGE_SIZE_MAX),
+                  order_by: OrderBy = OrderBy.id,
+                  session: AsyncSession = Depends(get_read_session),
                   _user: User = Depends(current_user)):
-    stmt = select(booking).filter(booking.c.id.between(start, start + step))
+    stmt = keyset_page(dataset_bookings(_user.dataset_id), order_by, cursor, limit)
 
     result = await session.execute(stmt)
 
-    result_dict = dict()
-
-    try:
-        for res in result.all():
-            result_temp = dict()
-            result_temp = res[0]
-            result_temp = {res[0]: {'booking_date': res[1],
-                                    'length_of_stay': res[2],
-                                    'guest_name': res[3],
-                                    'daily_rate': res[4]
-                                    }
-                           }
-            result_dict.update(result_temp)
-
-    except Exception:
-        raise HTTPException(status_code=400,
-                            detail="Index is out of range!")
-
-    return result_dict
+    return page_result(result.all(), order_by, limit)
 
 
 # 3. Allows searching for bookings based on various parameters such as guest name, booking dates, length of stay, etc.
 @bookings_routes.get('/search',
                      summary='Search in booking database with various parameters',
                      description='Allows searching for bookings based parameters: '
-                                 'guest name, booking dates, length of stay, daily_rate',
+                                 'guest name (words or their beginnings), booking date, length of stay, daily_rate '
+                                 '(exact value or range with _from/_to, _min/_max). '
+                                 'Result is paginated as list of bookings',
                      status_code=status.HTTP_200_OK
                      )
 async def get_search(response: Response,
-                     booking_date: str = '%',
-                     length_of_stay: str = '%',
-                     guest_name: str = '%',
-                     daily_rate: str = '%',
-                     session: AsyncSession = Depends(get_async_session),
+                     params: SearchParams = Depends(),
+                     cursor: str | None = None,
+                     limit: int = Query(default=BOOKINGS_PAGE_SIZE, gt=0, le=BOOKINGS_PAGE_SIZE_MAX),
+                     order_by: OrderBy = OrderBy.id,
+                     session: AsyncSession = Depends(get_read_session),
                      _user: User = Depends(current_user)):
-    if booking_date == '%' and length_of_stay == '%' and guest_name == '%' and daily_rate == '%':
+    if params.is_empty():
         response.status_code = 400
         return {"message": "Use at least one parameter"}
 
-    stmt = select(booking).filter(booking.c.length_of_stay.like(length_of_stay)).filter(
-        booking.c.guest_name.like(guest_name)).filter(
-        booking.c.booking_date.like(booking_date)).filter(
-        booking.c.daily_rate.like(daily_rate))
+    fulltext = await has_fulltext(session)
+    stmt = params.where(dataset_bookings(_user.dataset_id), fulltext)
+    stmt = keyset_page(stmt, order_by, cursor, limit, params.id_column(fulltext))
 
     result = await session.execute(stmt)
 
-    result_dict = dict()
+    return page_result(result.all(), order_by, limit)
 
-    try:
-        for res in result.all():
-            result_temp = dict()
-            result_temp = res[0]
-            result_temp = {res[0]: {'booking_date': res[1],
-                                    'length_of_stay': res[2],
-                                    'guest_name': res[3],
-                                    'daily_rate': res[4]
-                                    }
-                           }
-            result_dict.update(result_temp)
 
-    except Exception:
-        raise HTTPException(status_code=400,
-                            detail="Index is out of range!")
+# Streams bookings (all or matching the same parameters as /search) for downstream processing
+@bookings_routes.get('/export',
+                     summary='Export bookings in CSV, NDJSON or Arrow format',
+                     description='Streams bookings ordered by id. Accepts the same parameters as /bookings/search, '
+                                 'without them all bookings are exported. Format is set by "format" parameter '
+                                 'or Accept header (text/csv, application/x-ndjson, '
+                                 'application/vnd.apache.arrow.stream), CSV by default',
+                     status_code=status.HTTP_200_OK
+                     )
+async def get_export(params: SearchParams = Depends(),
+                     export_format: ExportFormat | None = Query(default=None, alias='format'),
+                     accept: str | None = Header(default=None),
+                     _user: User = Depends(current_user)):
+    export_format = export_format or negotiate_format(accept)
+    if not is_supported(export_format):
+        raise HTTPException(status_code=406,
+                            detail=f"Export to {export_format.value} isn't available on this server")
 
-    return result_dict
+    return StreamingResponse(export_bookings(_user.dataset_id, params, export_format),
+                             media_type=MEDIA_TYPES[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="bookings.{export_format.value}"'})
 
 
 # 4. Provides statistical information about the dataset, such as the total number of bookings,
@@ -152,21 +160,10 @@ async def get_search(response: Response,
                      summary='Describing statistical information about dataset',
                      description='Get complete describing statistical information about dataset. No any parameters.',
                      status_code=status.HTTP_200_OK)
-def get_stats(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
-
-    result = df.describe()
+async def get_stats(_user: User = Depends(current_user)):
+    result = await analytics_executor.run('stats', analytics.stats, dataset_path(_user.csvfile))
 
-    result_dict = result.to_dict()
-
-    for i, row in result.items():
-        i = tuple(i)
-        if i[0] in result_dict:
-            result_dict[i[0]].update({i[1]: row})
-        else:
-            result_dict[i[0]] = {i[1]: row}
-
-    return result_dict
+    return FastJSONResponse(result)
 
 
 # 5. Performs advanced analysis on the dataset, generating insights and trends based on specific criteria,
@@ -179,52 +176,18 @@ def get_stats(_user: User = Depends(current_user)):
                                  '"is_cancelled" - boolean - If client canceled booking?'
                                  ' "type_group" - "booking" or "arrival" - type of month when client make an action.',
                      status_code=status.HTTP_200_OK)
-def get_analysis(is_canceled: bool = Query(default=False),
-                 type_group: Type = Type.booking,
-                 _user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
-    if not is_canceled:
-        df = df[df['is_canceled'] == 0]
-
-    # Find revenue for each booking
-    df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-    df['total_revenue'] = df['adr'] * df['total_stay']
-
-    # Create 2 DataFrames with booking for only one type of hotel
-    df_resort = df[(df['hotel'] == 'Resort Hotel')]
-    df_city = df[(df['hotel'] == 'City Hotel')]
-
-    if type_group == Type.booking:
-        df_resort['booking_year'] = np.vectorize(booking_date_year)(df_resort['arrival_date_day_of_month'],
-                                                                    df_resort['arrival_date_month'],
-                                                                    df_resort['arrival_date_year'],
-                                                                    df_resort['lead_time'])
-        df_resort['booking_month'] = np.vectorize(booking_date_month)(df_resort['arrival_date_day_of_month'],
-                                                                      df_resort['arrival_date_month'],
-                                                                      df_resort['arrival_date_year'],
-                                                                      df_resort['lead_time'])
-        df_city['booking_year'] = np.vectorize(booking_date_year)(df_city['arrival_date_day_of_month'],
-                                                                  df_city['arrival_date_month'],
-                                                                  df_city['arrival_date_year'],
-                                                                  df_city['lead_time'])
-        df_city['booking_month'] = np.vectorize(booking_date_month)(df_city['arrival_date_day_of_month'],
-                                                                    df_city['arrival_date_month'],
-                                                                    df_city['arrival_date_year'],
-                                                                    df_city['lead_time'])
-        result_resort = df_resort.groupby(['booking_year', 'booking_month'])['total_revenue'].mean().reset_index()
-        result_city = df_city.groupby(['booking_year', 'booking_month'])['total_revenue'].mean().reset_index()
-
-        result = analysis_result(result_resort, result_city)
-
-    else:
-        result_resort = df_resort.groupby(['arrival_date_year',
-                                           'arrival_date_month'])['total_revenue'].mean().reset_index()
-        result_city = df_city.groupby(['arrival_date_year',
-                                       'arrival_date_month'])['total_revenue'].mean().reset_index()
-
-        result = analysis_result(result_resort, result_city)
-
-    return result
+async def get_analysis(is_canceled: bool = Query(default=False),
+                       type_group: Type = Type.booking,
+                       dataset_id: int | None = Depends(sql_dataset),
+                       session: AsyncSession = Depends(get_read_session),
+                       _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.analysis(session, dataset_id, is_canceled, type_group))
+
+    result = await analytics_executor.run('analysis', analytics.analysis, dataset_path(_user.csvfile),
+                                          is_canceled, type_group)
+
+    return FastJSONResponse(result)
 
 
 # Retrieves bookings based on the provided nationality.
@@ -236,30 +199,17 @@ def get_analysis(is_canceled: bool = Query(default=False),
                      description='Retrieve bookings based on the provided "nationality" as parameter. Use pagination '
                                  'for answer. It start from "start" position to "start+step"',
                      status_code=status.HTTP_200_OK)
-def get_by_nationality(nationality: str = Query(min_length=3, max_length=3),
-                       start: int = Query(default=0, ge=0),
-                       step: int = Query(default=5, gt=0),
-                       _user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
-
-    if nationality.upper() not in df['country'].dropna().unique():
+async def get_by_nationality(nationality: str = Query(min_length=3, max_length=3),
+                             start: int = Query(default=0, ge=0),
+                             step: int = Query(default=5, gt=0),
+                             _user: User = Depends(current_user)):
+    result = await analytics_executor.run('nationality', analytics.by_nationality, dataset_path(_user.csvfile),
+                                          nationality, start, step)
+    if result is None:
         raise HTTPException(status_code=404,
                             detail=f'Country {nationality} is absent in dataset.')
 
-    result = df[df['country'] == nationality.upper()].iloc[start:(start + step)]
-
-    result_dict = result.to_dict()
-
-    result_dict = dict()
-
-    for i, row in result.items():
-        for key, value in row.items():
-            if key in result_dict:
-                result_dict[key].update({str(i): str(value)})
-            else:
-                result_dict[key] = {str(i): str(value)}
-
-    return result_dict
+    return FastJSONResponse(result)
 
 
 # 7. Retrieves the most popular meal package among all bookings.
@@ -268,12 +218,16 @@ def get_by_nationality(nationality: str = Query(min_length=3, max_length=3),
                      summary='Retrieve the most popular meal package among all bookings',
                      description='Retrieves the most popular meal package among all bookings. No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_popular_meal_package(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
+async def get_popular_meal_package(dataset_id: int | None = Depends(sql_dataset),
+                                   session: AsyncSession = Depends(get_read_session),
+                                   _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.popular_meal_package(session, dataset_id))
 
-    result = df['meal'].value_counts().head(1)
+    result = await analytics_executor.run('popular_meal_package', analytics.popular_meal_package,
+                                          dataset_path(_user.csvfile))
 
-    return result.to_dict()
+    return FastJSONResponse(result)
 
 
 # 8. Retrieves the average length of stay grouped by booking year and hotel type.
@@ -283,28 +237,16 @@ def get_popular_meal_package(_user: User = Depends(current_user)):
                      description='Retrieves the average length of stay grouped by booking year and hotel type. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_avg_length_of_stay(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
-
-    df['booking_year'] = np.vectorize(booking_date_year)(df['arrival_date_day_of_month'],
-                                                         df['arrival_date_month'],
-                                                         df['arrival_date_year'],
-                                                         df['lead_time'])
-
-    df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
+async def get_avg_length_of_stay(dataset_id: int | None = Depends(sql_dataset),
+                                 session: AsyncSession = Depends(get_read_session),
+                                 _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.avg_length_of_stay(session, dataset_id))
 
-    result = df.groupby(['hotel', 'booking_year'])['total_stay'].mean().round(2)
+    result = await analytics_executor.run('avg_length_of_stay', analytics.avg_length_of_stay,
+                                          dataset_path(_user.csvfile))
 
-    result_dict = dict()
-
-    for i, row in result.items():
-        i = tuple(i)
-        if i[0] in result_dict:
-            result_dict[i[0]].update({i[1]: row})
-        else:
-            result_dict[i[0]] = {i[1]: row}
-
-    return result_dict
+    return FastJSONResponse(result)
 
 
 # 9. Retrieves the total revenue grouped by booking month and hotel type.
@@ -314,29 +256,15 @@ def get_avg_length_of_stay(_user: User = Depends(current_user)):
                      description='Retrieves the total revenue grouped by booking month and hotel type. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_total_revenue(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
-
-    df['booking_month'] = np.vectorize(booking_date_month)(df['arrival_date_day_of_month'],
-                                                           df['arrival_date_month'],
-                                                           df['arrival_date_year'],
-                                                           df['lead_time'])
-
-    df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-    df['total_revenue'] = df['adr'] * df['total_stay']
+async def get_total_revenue(dataset_id: int | None = Depends(sql_dataset),
+                            session: AsyncSession = Depends(get_read_session),
+                            _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.total_revenue(session, dataset_id))
 
-    result = df.groupby(['hotel', 'booking_month'])['total_revenue'].sum().round(2)
+    result = await analytics_executor.run('total_revenue', analytics.total_revenue, dataset_path(_user.csvfile))
 
-    result_dict = dict()
-
-    for i, row in result.items():
-        i = tuple(i)
-        if i[0] in result_dict:
-            result_dict[i[0]].update({i[1]: row})
-        else:
-            result_dict[i[0]] = {i[1]: row}
-
-    return result_dict
+    return FastJSONResponse(result)
 
 
 # 10. Retrieves the top 5 countries with the highest number of bookings.
@@ -345,12 +273,15 @@ def get_total_revenue(_user: User = Depends(current_user)):
                      summary='Retrieve the top 5 countries with the highest number of bookings',
                      description='Retrieve the top 5 countries with the highest number of bookings. No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_top_countries(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
+async def get_top_countries(dataset_id: int | None = Depends(sql_dataset),
+                            session: AsyncSession = Depends(get_read_session),
+                            _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.top_countries(session, dataset_id))
 
-    result = df['country'].value_counts().head(5)
+    result = await analytics_executor.run('top_countries', analytics.top_countries, dataset_path(_user.csvfile))
 
-    return {"data": result.to_dict()}
+    return FastJSONResponse(result)
 
 
 # 11. Retrieves the percentage of repeated guests among all bookings.
@@ -359,12 +290,16 @@ def get_top_countries(_user: User = Depends(current_user)):
                      summary='Retrieve the percentage of repeated guests among all bookings',
                      description='Retrieve the percentage of repeated guests among all bookings. No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_repeated_guests_percentage(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
+async def get_repeated_guests_percentage(dataset_id: int | None = Depends(sql_dataset),
+                                         session: AsyncSession = Depends(get_read_session),
+                                         _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.repeated_guests_percentage(session, dataset_id))
 
-    result = (len(df[df['is_repeated_guest'] == 1]) / len(df)) * 100
+    result = await analytics_executor.run('repeated_guests_percentage', analytics.repeated_guests_percentage,
+                                          dataset_path(_user.csvfile))
 
-    return {"result": f'{result:.4f}'}
+    return FastJSONResponse(result)
 
 
 # 12. Retrieves the total number of guests (adults, children, and babies) by booking year.
@@ -373,14 +308,16 @@ def get_repeated_guests_percentage(_user: User = Depends(current_user)):
                      summary='Retrieve the total number of guests by booking year',
                      description='Retrieve the total number of guests (adults, children, and babies) grouped by year.',
                      status_code=status.HTTP_200_OK)
-def get_total_guests_by_year(_user: User = Depends(current_user)):
-    df = get_dataframe(_user.csvfile)
-
-    df['sum'] = df[['adults', 'children', 'babies']].sum(axis=1)
+async def get_total_guests_by_year(dataset_id: int | None = Depends(sql_dataset),
+                                   session: AsyncSession = Depends(get_read_session),
+                                   _user: User = Depends(current_user)):
+    if dataset_id is not None:
+        return FastJSONResponse(await pushdown.total_guests_by_year(session, dataset_id))
 
-    result = df[['sum', 'arrival_date_year']].groupby(['arrival_date_year']).sum()
+    result = await analytics_executor.run('total_guests_by_year', analytics.total_guests_by_year,
+                                          dataset_path(_user.csvfile))
 
-    return result.to_dict()['sum']
+    return FastJSONResponse(result)
 
 
 # 13. Retrieves the average daily rate by month for resort hotel bookings.
@@ -390,13 +327,10 @@ def get_total_guests_by_year(_user: User = Depends(current_user)):
                      description='Retrieves the average daily rate by month for resort hotel bookings. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_avg_daily_rate_resort(_user: Annotated[str, Depends(verify_credentials)]):
-    df = pd.read_csv('demo/hotel_booking_data.csv')
+async def get_avg_daily_rate_resort(_user: Annotated[str, Depends(verify_credentials)]):
+    result = await analytics_executor.run('avg_daily_rate_resort', analytics.avg_daily_rate_resort, DEMO_FILE)
 
-    result = df[df['hotel'] == "Resort Hotel"].groupby(['arrival_date_month'])['adr'].mean().sort_values(
-        ascending=False).round(2)
-
-    return result.to_dict()
+    return FastJSONResponse(result)
 
 
 # 14. Retrieves the most common arrival date day of the week for city hotel bookings.
@@ -406,21 +340,11 @@ def get_avg_daily_rate_resort(_user: Annotated[str, Depends(verify_credentials)]
                      description='Retrieves the most common arrival date day of the week for city hotel bookings. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_most_common_arrival_day_city(_user: Annotated[str, Depends(verify_credentials)]):
-    df = pd.read_csv('demo/hotel_booking_data.csv')
-
-    new_df = df[df['hotel'] == "City Hotel"][['arrival_date_year',
-                                              'arrival_date_month',
-                                              'arrival_date_day_of_month']]
-    new_df['date'] = np.vectorize(date_from_columns)(new_df['arrival_date_day_of_month'],
-                                                     new_df['arrival_date_month'],
-                                                     new_df['arrival_date_year'])
-
-    new_df['date'] = pd.to_datetime(new_df['date']).dt.day_name()
-
-    result = new_df['date'].value_counts().head(1)
+async def get_most_common_arrival_day_city(_user: Annotated[str, Depends(verify_credentials)]):
+    result = await analytics_executor.run('most_common_arrival_day_city', analytics.most_common_arrival_day_city,
+                                          DEMO_FILE)
 
-    return result.to_dict()
+    return FastJSONResponse(result)
 
 
 # 15. Retrieves the count of bookings grouped by hotel type and meal package.
@@ -430,21 +354,10 @@ def get_most_common_arrival_day_city(_user: Annotated[str, Depends(verify_creden
                      description='Retrieve the count of bookings grouped by hotel type and meal package. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_count_by_hotel_meal(_user: Annotated[str, Depends(verify_credentials)]):
-    df = pd.read_csv('demo/hotel_booking_data.csv')
-
-    result = df.groupby(['hotel', 'meal'])['adr'].count()
-
-    result_dict = dict()
-
-    for i, row in result.items():
-        i = tuple(i)
-        if i[0] in result_dict:
-            result_dict[i[0]].update({i[1]: row})
-        else:
-            result_dict[i[0]] = {i[1]: row}
+async def get_count_by_hotel_meal(_user: Annotated[str, Depends(verify_credentials)]):
+    result = await analytics_executor.run('count_by_hotel_meal', analytics.count_by_hotel_meal, DEMO_FILE)
 
-    return result_dict
+    return FastJSONResponse(result)
 
 
 # 16. Retrieves the total revenue by country for resort hotel bookings.
@@ -454,14 +367,11 @@ def get_count_by_hotel_meal(_user: Annotated[str, Depends(verify_credentials)]):
                      description='Retrieve the total revenue by country for resort hotel bookings. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_total_revenue_resort_by_country(_user: Annotated[str, Depends(verify_credentials)]):
-    df = pd.read_csv('demo/hotel_booking_data.csv')
+async def get_total_revenue_resort_by_country(_user: Annotated[str, Depends(verify_credentials)]):
+    result = await analytics_executor.run('total_revenue_resort_by_country',
+                                          analytics.total_revenue_resort_by_country, DEMO_FILE)
 
-    df['total_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-    df['total_revenue'] = df['adr'] * df['total_stay']
-    result = df[df['hotel'] == "Resort Hotel"].groupby(['country'])['total_revenue'].sum()
-
-    return result.to_dict()
+    return FastJSONResponse(result)
 
 
 # 17. Retrieves the count of bookings grouped by hotel type and repeated guest status.
@@ -471,21 +381,40 @@ def get_total_revenue_resort_by_country(_user: Annotated[str, Depends(verify_cre
                      description='Retrieve the count of bookings grouped by hotel type and repeated guest status. '
                                  'No any parameters',
                      status_code=status.HTTP_200_OK)
-def get_count_by_hotel_repeated_guest(_user: Annotated[str, Depends(verify_credentials)]):
-    df = pd.read_csv('demo/hotel_booking_data.csv')
+async def get_count_by_hotel_repeated_guest(_user: Annotated[str, Depends(verify_credentials)]):
+    result = await analytics_executor.run('count_by_hotel_repeated_guest', analytics.count_by_hotel_repeated_guest,
+                                          DEMO_FILE)
+
+    return FastJSONResponse(result)
+
 
-    result = df.groupby(['hotel', 'is_repeated_guest'])['adr'].count()
+# Metrics of bookings by any dimensions of dataset, filtered and limited to top N, in one pass
+@bookings_routes.get('/aggregate',
+                     summary='Aggregate bookings by dimensions',
+                     description='Compute "metrics" (count; sum, mean, min, max of adr, revenue, stay, guests) '
+                                 'grouped by "group_by" dimensions of bookings matching "filter". '
+                                 'With "top" only top groups by "order_by" metric are returned. '
+                                 f'Results of more than {AGGREGATE_MAX_GROUPS} groups without "top" are refused.',
+                     status_code=status.HTTP_200_OK)
+async def get_aggregate(params: AggregateParams = Depends(),
+                        _user: User = Depends(current_user)):
+    result = await analytics_executor.run('aggregate', aggregate, dataset_path(_user.csvfile), *params.args())
+    if result is None:
+        raise HTTPException(status_code=400,
+                            detail=f'Result has more than {AGGREGATE_MAX_GROUPS} groups. '
+                                   f'Use filters, less dimensions or "top"')
 
-    result_dict = dict()
+    return FastJSONResponse(result)
 
-    for i, row in result.items():
-        i = tuple(i)
-        if i[0] in result_dict:
-            result_dict[i[0]].update({i[1]: row})
-        else:
-            result_dict[i[0]] = {i[1]: row}
 
-    return result_dict
+# Counters of dataset caches: hits, misses, evictions and memory usage.
+@bookings_routes.get('/cache_stats',
+                     summary='Statistics of dataset cache',
+                     description='Retrieve hit/miss/eviction counters and memory usage of dataset caches, '
+                                 'summed over analytics workers. No any parameters',
+                     status_code=status.HTTP_200_OK)
+def get_cache_stats(_user: User = Depends(current_user)):
+    return analytics_executor.cache_stats()
 
 
 # 2. Retrieves details of a specific booking by its unique ID.
@@ -495,9 +424,9 @@ def get_count_by_hotel_repeated_guest(_user: Annotated[str, Depends(verify_crede
                                  'It raises 400 error if index is out of range.',
                      status_code=status.HTTP_200_OK)
 async def get_count_by_hotel_repeated_guest(booking_id: int,
-                                            session: AsyncSession = Depends(get_async_session),
+                                            session: AsyncSession = Depends(get_read_session),
                                             _user: User = Depends(current_user)):
-    stmt = select(booking).where(booking.c.id == booking_id)
+    stmt = dataset_bookings(_user.dataset_id).where(booking.c.id == booking_id)
 
     result = await session.execute(stmt)
 
@@ -0,0 +1,117 @@
+"""
+Declared types of dataset columns (see app.csv_tool.validation.index), applied on load.
+
+pd.read_csv infers object columns for strings and int64 for integers. Low-cardinality
+strings are categorical instead, integers are downcast, reservation_status_date is parsed.
+Floats stay float64: adr is summed into revenues and means of floats are accumulated
+in their own type, so float32 would change results of API.
+
+    python -m app.booking.schema temporary/data.csv
+
+prints bytes per row of dataset with inferred and declared types.
+"""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CATEGORY_COLUMNS = ['hotel', 'arrival_date_month', 'meal', 'country', 'market_segment', 'distribution_channel',
+                    'reserved_room_type', 'assigned_room_type', 'deposit_type', 'customer_type',
+                    'reservation_status']
+# Columns are downcast only if all their values fit in type, otherwise they stay int64.
+# Sums of two columns (e.g. nights of stay) must not overflow either.
+INTEGER_TYPES = {'is_canceled': 'int8', 'lead_time': 'int16', 'arrival_date_year': 'int16',
+                 'arrival_date_week_number': 'int8', 'arrival_date_day_of_month': 'int8',
+                 'stays_in_weekend_nights': 'int16', 'stays_in_week_nights': 'int16', 'adults': 'int16',
+                 'babies': 'int16', 'is_repeated_guest': 'int8', 'previous_cancellations': 'int16',
+                 'previous_bookings_not_canceled': 'int16', 'booking_changes': 'int16',
+                 'days_in_waiting_list': 'int16', 'required_car_parking_spaces': 'int8',
+                 'total_of_special_requests': 'int8'}
+DATETIME_FORMATS = {'reservation_status_date': '%Y-%m-%d'}
+
+
+def _fits(values: pd.Series, dtype: str) -> bool:
+    if values.dtype.kind not in 'iu':
+        # Missing values make integer column float
+        return False
+    if not len(values):
+        return True
+    limits = np.iinfo(dtype)
+    return limits.min <= values.min() and values.max() <= limits.max
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast columns of dataset "df" to declared types. Columns absent in schema are left as they are.
+    """
+    types = {}
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            types[column] = 'category'
+        elif column in INTEGER_TYPES and _fits(df[column], INTEGER_TYPES[column]):
+            types[column] = INTEGER_TYPES[column]
+    if types:
+        df = df.astype(types)
+
+    for column, date_format in DATETIME_FORMATS.items():
+        if column in df.columns and df[column].dtype == object:
+            try:
+                df[column] = pd.to_datetime(df[column], format=date_format)
+            except ValueError:
+                # Dates of unexpected format are kept as strings
+                pass
+
+    return df
+
+
+def format_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parsed dates of "df" as strings in format of dataset, as they are shown in API
+    """
+    for column, date_format in DATETIME_FORMATS.items():
+        if column in df.columns and df[column].dtype.kind == 'M':
+            df[column] = df[column].dt.strftime(date_format)
+    return df
+
+
+def concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    pd.concat of frames with declared types. Categories of categorical columns are merged,
+    so they stay categorical (pd.concat makes them object if categories differ).
+    """
+    result = pd.concat(frames)
+    for column in result.columns:
+        columns = [frame[column] for frame in frames]
+        if result[column].dtype == object and all(isinstance(c.dtype, pd.CategoricalDtype) for c in columns):
+            result[column] = pd.Series(union_categoricals(columns, sort_categories=True), index=result.index)
+    return result
+
+
+def bytes_per_row(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(deep=True).sum() / max(len(df), 1), 1)
+
+
+def schema_report(path: str, rows: int | None = None) -> dict:
+    """
+    Memory usage of the first "rows" rows (all if None) of CSV file with types
+    inferred by pd.read_csv and with declared types: in total and by column
+    """
+    inferred = pd.read_csv(path, nrows=rows)
+    declared = apply_schema(inferred)
+    inferred_bytes = inferred.memory_usage(deep=True, index=False)
+    declared_bytes = declared.memory_usage(deep=True, index=False)
+
+    return {'rows': len(inferred),
+            'inferred_bytes_per_row': bytes_per_row(inferred),
+            'declared_bytes_per_row': bytes_per_row(declared),
+            'columns': {column: {'inferred_type': str(inferred[column].dtype),
+                                 'declared_type': str(declared[column].dtype),
+                                 'inferred_bytes_per_row': round(inferred_bytes[column] / max(len(inferred), 1), 1),
+                                 'declared_bytes_per_row': round(declared_bytes[column] / max(len(declared), 1), 1)}
+                        for column in inferred.columns}}
+
+
+if __name__ == '__main__':
+    print(json.dumps(schema_report(sys.argv[1]), indent=2))
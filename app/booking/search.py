@@ -0,0 +1,84 @@
+import datetime
+
+from fastapi import Query
+from sqlalchemy import ColumnElement
+from sqlalchemy import Select
+
+from app.booking.fulltext import FULLTEXT_TABLE
+from app.booking.fulltext import booking_fts
+from app.booking.fulltext import match_query
+from models.models import booking
+
+
+class SearchParams:
+    """
+    Typed filters of bookings. Only supplied parameters become predicates, so each of them
+    can be served by index: range on booking_date, length_of_stay, daily_rate and
+    full-text prefix search on guest_name.
+    """
+
+    def __init__(self,
+                 booking_date: datetime.date | None = None,
+                 booking_date_from: datetime.date | None = None,
+                 booking_date_to: datetime.date | None = None,
+                 length_of_stay: int | None = Query(default=None, ge=0),
+                 length_of_stay_min: int | None = Query(default=None, ge=0),
+                 length_of_stay_max: int | None = Query(default=None, ge=0),
+                 daily_rate: float | None = None,
+                 daily_rate_min: float | None = None,
+                 daily_rate_max: float | None = None,
+                 guest_name: str | None = Query(default=None, min_length=1)):
+        self.booking_date = booking_date
+        self.booking_date_from = booking_date_from
+        self.booking_date_to = booking_date_to
+        self.length_of_stay = length_of_stay
+        self.length_of_stay_min = length_of_stay_min
+        self.length_of_stay_max = length_of_stay_max
+        self.daily_rate = daily_rate
+        self.daily_rate_min = daily_rate_min
+        self.daily_rate_max = daily_rate_max
+        self.guest_name = guest_name
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in vars(self).values())
+
+    def where(self, stmt: Select, fulltext: bool = False) -> Select:
+        """
+        Add predicates of supplied parameters to "stmt". Guest name is searched
+        in full-text index if "fulltext" is True, otherwise by prefix of the name.
+        """
+        ranges = [(booking.c.booking_date, self.booking_date, self.booking_date_from, self.booking_date_to),
+                  (booking.c.length_of_stay, self.length_of_stay, self.length_of_stay_min, self.length_of_stay_max),
+                  (booking.c.daily_rate, self.daily_rate, self.daily_rate_min, self.daily_rate_max)]
+        for column, exact, low, high in ranges:
+            if exact is not None:
+                stmt = stmt.where(column == exact)
+            if low is not None:
+                stmt = stmt.where(column >= low)
+            if high is not None:
+                stmt = stmt.where(column <= high)
+
+        if self.guest_name is not None:
+            query = self._match_query(fulltext)
+            if query is not None:
+                stmt = stmt.join(booking_fts, booking_fts.c.rowid == booking.c.id).where(
+                    booking_fts.c[FULLTEXT_TABLE].match(query))
+            else:
+                stmt = stmt.where(booking.c.guest_name.startswith(self.guest_name, autoescape=True))
+
+        return stmt
+
+    def id_column(self, fulltext: bool = False) -> ColumnElement:
+        """
+        Column of id for pagination. With full-text search it is rowid of the index:
+        constraints on it let the index return matches in order of id
+        without reading all of them.
+        """
+        if self._match_query(fulltext) is not None:
+            return booking_fts.c.rowid
+        return booking.c.id
+
+    def _match_query(self, fulltext: bool) -> str | None:
+        if self.guest_name is None or not fulltext:
+            return None
+        return match_query(self.guest_name)
@@ -0,0 +1,191 @@
+"""
+Aggregation of datasets larger than memory.
+
+Files bigger than STREAMING_THRESHOLD are never loaded as a whole: analytics read them
+by chunks (see app.booking.columnar.iter_chunks) and combine partial aggregates of chunks.
+Counts, sums, means, minimums and maximums are exact. Quantiles of describe are computed
+on a uniform sample of STREAMING_SAMPLE_SIZE rows, so they are exact for smaller files only.
+Small results are kept in dataset cache by version of file, as cube is.
+"""
+import copy
+import os
+from typing import Iterable
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from app.booking.cache import dataframe_cache
+from app.booking.columnar import FLOAT_COLUMNS
+from app.booking.columnar import INTEGER_COLUMNS
+from app.booking.columnar import iter_chunks
+
+STREAMING_THRESHOLD = int(os.getenv('STREAMING_THRESHOLD_MB', '1024')) * 1024 * 1024
+STREAMING_CHUNK_SIZE = int(os.getenv('STREAMING_CHUNK_SIZE', '250000'))
+STREAMING_SAMPLE_SIZE = int(os.getenv('STREAMING_SAMPLE_SIZE', '100000'))
+
+NUMERIC_COLUMNS = INTEGER_COLUMNS + FLOAT_COLUMNS
+QUANTILES = [25, 50, 75]
+
+
+def is_large(path: str) -> bool:
+    """
+    Dataset stored in "path" is aggregated by chunks
+    """
+    return os.path.getsize(path) > STREAMING_THRESHOLD
+
+
+def chunks(path: str, columns: list[str] | None = None) -> Iterator[pd.DataFrame]:
+    return iter_chunks(path, columns, STREAMING_CHUNK_SIZE)
+
+
+class Describe:
+    """
+    Partial DataFrame.describe() of numeric columns: counts, means and sums of squared
+    deviations (merged by Chan's formula), minimums, maximums and sample of rows for quantiles
+    """
+
+    def __init__(self, sample_size: int = STREAMING_SAMPLE_SIZE, seed: int = 0):
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.columns = None
+        self.count = self.mean = self.m2 = self.min = self.max = None
+        self.sample = None
+        self.priorities = None
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if self.columns is None:
+            self.columns = [column for column in chunk.columns if column in NUMERIC_COLUMNS]
+        chunk = chunk[self.columns].astype('float64')
+
+        count = chunk.count().to_numpy(dtype='float64')
+        mean = chunk.mean().to_numpy()
+        m2 = ((chunk - mean) ** 2).sum().to_numpy()
+        minimum = chunk.min().to_numpy()
+        maximum = chunk.max().to_numpy()
+
+        if self.count is None:
+            self.count, self.mean, self.m2, self.min, self.max = count, mean, m2, minimum, maximum
+        else:
+            total = self.count + count
+            with np.errstate(invalid='ignore', divide='ignore'):
+                delta = np.nan_to_num(mean) - np.nan_to_num(self.mean)
+                self.mean = np.where(total > 0, np.nan_to_num(self.mean) + delta * count / total, np.nan)
+                self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+            self.count = total
+            self.min = np.fmin(self.min, minimum)
+            self.max = np.fmax(self.max, maximum)
+
+        # Bottom-k sampling: rows with the smallest random priorities are a uniform sample
+        values = chunk.to_numpy()
+        priorities = self.rng.random(len(values))
+        if self.sample is not None:
+            values = np.concatenate([self.sample, values])
+            priorities = np.concatenate([self.priorities, priorities])
+        if len(values) > self.sample_size:
+            keep = np.argpartition(priorities, self.sample_size)[:self.sample_size]
+            values, priorities = values[keep], priorities[keep]
+        self.sample, self.priorities = values, priorities
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory of statistics and sample, to account it in dataset cache
+        """
+        arrays = [self.count, self.mean, self.m2, self.min, self.max, self.sample, self.priorities]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def result(self) -> pd.DataFrame:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+        quantiles = [_nanpercentile(self.sample, q) for q in QUANTILES]
+
+        return pd.DataFrame([self.count, self.mean, std, self.min, *quantiles, self.max],
+                            index=['count', 'mean', 'std', 'min', *[f'{q}%' for q in QUANTILES], 'max'],
+                            columns=self.columns)
+
+
+def _nanpercentile(values: np.ndarray, q: float) -> np.ndarray:
+    result = np.full(values.shape[1], np.nan)
+    for i in range(values.shape[1]):
+        column = values[:, i]
+        column = column[~np.isnan(column)]
+        if len(column):
+            result[i] = np.percentile(column, q)
+    return result
+
+
+def _describe(path: str) -> Describe:
+    describe = Describe()
+    for chunk in chunks(path):
+        describe.update(chunk)
+    return describe
+
+
+def append_describe(describe: Describe, delta: pd.DataFrame) -> Describe:
+    """
+    Partial describe of dataset after rows "delta" have been appended to it.
+    Cached one is kept as it is: it can be read for the previous version of file.
+    """
+    describe = copy.deepcopy(describe)
+    describe.update(delta)
+    return describe
+
+
+def describe(path: str) -> pd.DataFrame:
+    """
+    Statistics of numeric columns of dataset as of DataFrame.describe().
+    Partial describe is cached, so appended rows are merged into it (see append_describe).
+    """
+    return dataframe_cache.derived(path, 'describe', _describe).result()
+
+
+def combine_counts(parts: Iterable[pd.Series]) -> pd.Series:
+    """
+    Sum of value counts of chunks, ordered by count as Series.value_counts()
+    """
+    counts = None
+    for part in parts:
+        counts = part if counts is None else counts.add(part, fill_value=0)
+    if counts is None:
+        return pd.Series(dtype='int64')
+    return counts.astype('int64').sort_values(ascending=False, kind='stable')
+
+
+def value_counts(path: str, column: str, dropna: bool = True) -> pd.Series:
+    """
+    Counts of values of "column" of dataset, missing values are counted if "dropna" is False
+    """
+    counts = dataframe_cache.derived(
+        path, f'value_counts:{column}',
+        lambda _: combine_counts(chunk[column].value_counts(dropna=False) for chunk in chunks(path, [column])))
+    return counts[counts.index.notna()] if dropna else counts
+
+
+def grouped_mean(frames: Iterable[pd.DataFrame], keys: list[str], column: str) -> pd.Series:
+    """
+    Mean of "column" grouped by "keys" over all frames, from sums and counts of each frame
+    """
+    parts = [frame.groupby(keys, observed=True)[column].agg(['sum', 'count']) for frame in frames]
+    totals = pd.concat(parts).groupby(level=list(range(len(keys))), observed=True).sum()
+    return totals['sum'] / totals['count']
+
+
+def find_rows(path: str, column: str, value, start: int, step: int) -> pd.DataFrame | None:
+    """
+    Rows of dataset with "value" in "column" from "start" position to "start+step"
+    among such rows. Reading stops as soon as they are found. None if there are no such rows.
+    """
+    found = 0
+    rows = []
+    for chunk in chunks(path):
+        chunk = chunk[chunk[column] == value]
+        if len(chunk) and found + len(chunk) > start:
+            rows.append(chunk.iloc[max(start - found, 0):start + step - found])
+        found += len(chunk)
+        if found >= start + step:
+            break
+
+    if not found:
+        return None
+    return pd.concat(rows) if rows else pd.DataFrame()
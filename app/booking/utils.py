@@ -1,85 +1,88 @@
-from datetime import datetime, timedelta
-
 import os
 
-import pandas as pd
 import numpy as np
-from sqlalchemy import insert
-from sqlalchemy.ext.asyncio import AsyncSession
+import pandas as pd
 
-from models.models import booking
+from app.booking.cache import dataframe_cache
+from app.booking.columnar import read_columns
+from app.booking.cube import load_cube
+from app.booking.dates import month_names
+from app.metrics import span
 
+DEMO_FILE = "demo/hotel_booking_data.csv"
 
-def get_dataframe(filename: str):
+
+def dataset_path(filename: str) -> str:
     if os.path.isfile("temporary/" + filename):
-        return pd.read_csv("temporary/" + filename)
+        return "temporary/" + filename
     else:
-        return pd.read_csv("demo/hotel_booking_data.csv")
-
+        return DEMO_FILE
 
-def date_from_columns(day, month, year):
-    date = datetime.strptime(f'{year}-{month}-{day}', '%Y-%B-%d')
-    return date
 
+def load_dataframe(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Return "columns" (all if None) of dataset stored in "path" from shared cache.
+    Returned frame is a copy-on-write view: changing it doesn't affect cached data.
+    """
+    with span('dataframe'):
+        return dataframe_cache.get(path, columns, loader=read_columns)
 
-def booking_date(day, month, year, number):
-    return date_from_columns(day, month, year) - timedelta(days=int(number))
 
+def get_dataframe(filename: str, columns: list[str] | None = None) -> pd.DataFrame:
+    return load_dataframe(dataset_path(filename), columns)
 
-def booking_date_month(day, month, year, number):
-    date = booking_date(day, month, year, number)
-    return datetime.strftime(date, '%B')
 
+def get_cube(filename: str) -> pd.DataFrame:
+    """
+    Aggregate cube of dataset (see app.booking.cube), built once per version of file
+    """
+    return load_cube(dataset_path(filename))
 
-def booking_date_year(day, month, year, number):
-    date = booking_date(day, month, year, number)
-    return datetime.strftime(date, '%Y')
 
+def build_country_index(path: str) -> dict[str, np.ndarray]:
+    """
+    Sorted positions of rows of each country in dataset stored in "path"
+    """
+    df = load_dataframe(path, ['country'])
+    with span('groupby'):
+        return df.groupby('country', sort=False, observed=True).indices
 
-async def dataframe_to_sql(df: pd.DataFrame, session: AsyncSession = None):
-    new_df = pd.DataFrame()
 
-    new_df['booking_date'] = np.vectorize(booking_date)(df['arrival_date_day_of_month'],
-                                                        df['arrival_date_month'],
-                                                        df['arrival_date_year'],
-                                                        df['lead_time'])
-    new_df['length_of_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-    new_df['guest_name'] = df['name']
-    new_df['daily_rate'] = df['adr']
+def append_country_index(index: dict[str, np.ndarray], delta: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Country index after rows "delta" have been appended to dataset.
+    Index of delta continues index of dataset, so its labels are positions of rows.
+    """
+    index = dict(index)
+    for country, positions in delta.groupby('country', sort=False, observed=True).indices.items():
+        positions = delta.index.to_numpy()[positions]
+        index[country] = positions if country not in index else np.concatenate([index[country], positions])
+    return index
 
-    result = new_df.to_dict()
 
-    for i in range(len(new_df)):
-        stmt = insert(booking).values(booking_date=result['booking_date'][i],
-                                      length_of_stay=result['length_of_stay'][i],
-                                      guest_name=result['guest_name'][i] + 'checking',
-                                      daily_rate=result['daily_rate'][i])
-        await session.execute(stmt)
-        await session.commit()
+def load_country_index(path: str) -> dict[str, np.ndarray]:
+    """
+    Country index of dataset (see build_country_index), built once per version of file
+    """
+    return dataframe_cache.derived(path, 'country_index', build_country_index)
 
 
 def analysis_result(result_resort: pd.DataFrame, result_city: pd.DataFrame) -> dict:
     result_resort.columns = ['year', 'month', 'total_revenue']
     result_city.columns = ['year', 'month', 'total_revenue']
 
-    result_resort = result_resort.to_dict()
-    result_city = result_city.to_dict()
-
-    result_resort_dict = dict()
-    result_city_dict = dict()
-
-    for k, v in result_resort['year'].items():
-        result_resort_dict[k] = {'year': result_resort['year'][k]}
-        result_resort_dict[k].update({'month': result_resort['month'][k]})
-        result_resort_dict[k].update({'total_revenue': result_resort['total_revenue'][k]})
-
-    for k, v in result_city['year'].items():
-        result_city_dict[k] = {'year': result_city['year'][k]}
-        result_city_dict[k].update({'month': result_city['month'][k]})
-        result_city_dict[k].update({'total_revenue': result_city['total_revenue'][k]})
-
     result = dict()
-    result['City Hotel'] = result_city_dict
-    result['Resort Hotel'] = result_resort_dict
+    result['City Hotel'] = result_city.to_dict('index')
+    result['Resort Hotel'] = result_resort.to_dict('index')
 
     return result
+
+
+def booking_month_names(result: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replace numbers in "year" and "month" columns of grouped result by '%Y' and '%B'
+    strings and order rows by them, as booking months are shown in API
+    """
+    result['year'] = result['year'].astype(str)
+    result['month'] = month_names(result['month'])
+    return result.sort_values(['year', 'month'], ignore_index=True)
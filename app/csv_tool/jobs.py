@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from enum import Enum
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.booking.columnar import count_rows
+from app.booking.columnar import is_sidecar_fresh
+from app.booking.columnar import write_sidecar
+from app.booking.cube import write_cube
+from app.booking.datasets import activate_dataset
+from app.booking.datasets import DATASET_DROP_DELAY
+from app.booking.datasets import create_dataset
+from app.booking.datasets import drop_retired_datasets
+from app.booking.ingestion import ingest_file
+from app.booking.locks import async_dataset_lock
+from app.database import async_session_maker
+from app.user.cache import user_cache
+
+# SQLite has a single writer, so jobs are executed one by one by default.
+# Datasets of different users are independent, so with other databases jobs can run concurrently
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '1'))
+# Number of finished jobs kept for polling
+INGESTION_JOBS_HISTORY = int(os.getenv('INGESTION_JOBS_HISTORY', '100'))
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    finished = "finished"
+    failed = "failed"
+
+
+class IngestionJob:
+    def __init__(self, filename: str, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.user_id = user_id
+        self.status = JobStatus.queued
+        self.rows = 0
+        self.total_rows = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.finished, JobStatus.failed)
+
+    def progress(self, rows: int) -> None:
+        self.rows = rows
+
+    def to_dict(self) -> dict:
+        elapsed = None
+        rows_per_second = None
+        eta = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            if elapsed > 0:
+                rows_per_second = round(self.rows / elapsed)
+            if not self.done and rows_per_second and self.total_rows is not None:
+                eta = round(max(self.total_rows - self.rows, 0) / rows_per_second, 1)
+
+        return {'id': self.id,
+                'filename': self.filename,
+                'status': self.status.value,
+                'rows': self.rows,
+                'total_rows': self.total_rows,
+                'elapsed_seconds': None if elapsed is None else round(elapsed, 3),
+                'rows_per_second': rows_per_second,
+                'eta_seconds': eta,
+                'error': self.error}
+
+
+class IngestionJobs:
+    """
+    Registry of ingestion jobs. Jobs run as tasks of the event loop, at most
+    "workers" of them at once; heavy pandas work of each job is done in thread pool.
+    Bookings of the replaced dataset are dropped DATASET_DROP_DELAY seconds
+    after a job has finished, between jobs.
+    """
+
+    def __init__(self, workers: int = INGESTION_WORKERS, history: int = INGESTION_JOBS_HISTORY):
+        self.history = history
+        self._semaphore = asyncio.Semaphore(workers)
+        self._jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, filename: str, user_id: int) -> IngestionJob:
+        job = IngestionJob(filename, user_id)
+        self._jobs[job.id] = job
+        self._forget_finished()
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return job
+
+    def get(self, job_id: str) -> IngestionJob | None:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: IngestionJob) -> None:
+        path = "temporary/" + job.filename
+
+        async with self._semaphore:
+            job.status = JobStatus.running
+            job.started_at = time.time()
+            try:
+                # Appends to the file wait until it is loaded (see app.booking.locks)
+                async with async_dataset_lock(path):
+                    # Typed columnar copy and cube are built before the dataset is activated.
+                    # Both are optional: analysis falls back to CSV and builds cube on first read
+                    if not await run_in_threadpool(is_sidecar_fresh, path):
+                        await run_in_threadpool(write_sidecar, path)
+                    await run_in_threadpool(write_cube, path)
+
+                    job.total_rows = await run_in_threadpool(count_rows, path)
+
+                    # New dataset is filled and switched to in one transaction:
+                    # readers see the previous dataset until commit
+                    async with async_session_maker() as session:
+                        dataset_id = await create_dataset(session, job.filename, job.user_id)
+                        await ingest_file(path, session, dataset_id, progress=job.progress)
+
+                        await activate_dataset(session, dataset_id, job.user_id)
+
+                        await session.commit()
+                # File and dataset of user have changed
+                user_cache.invalidate(job.user_id)
+
+                job.status = JobStatus.finished
+            except Exception as e:
+                job.error = f'{type(e).__name__}: {e}'
+                job.status = JobStatus.failed
+            finally:
+                job.finished_at = time.time()
+
+        # Processes serving cached user may read the replaced dataset for a while
+        await asyncio.sleep(DATASET_DROP_DELAY)
+        async with self._semaphore:
+            try:
+                await drop_retired_datasets(async_session_maker)
+            except Exception:
+                # Retired datasets are invisible to readers, they will be dropped after the next load
+                pass
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+
+ingestion_jobs = IngestionJobs()
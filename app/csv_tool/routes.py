@@ -1,28 +1,43 @@
-import numpy as np
 from fastapi import APIRouter, Depends
 from fastapi import UploadFile
 from fastapi import File
 from fastapi import HTTPException
 from fastapi import status
-from sqlalchemy import update, insert, delete
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 from app.csv_tool.validation import is_csv_valid
 from app.csv_tool.validation import create_temporary
+from app.csv_tool.upload import save_upload
 
+import asyncio
+import json
 import os
+import uuid
 
-from app.database import get_async_session
+from app.csv_tool.jobs import IngestionJob
+from app.csv_tool.jobs import ingestion_jobs
 from app.user.config import fastapi_users
 from app.user.models import User
-from models.models import user, booking
 
-from app.booking.utils import booking_date
-
-import pandas as pd
+from app.booking.append import append_cached
+from app.booking.append import append_dataset
+from app.booking.append import has_rows
+from app.booking.append import read_header
+from app.booking.append import truncate_dataset
+from app.booking.executor import analytics_executor
+from app.booking.columnar import derived_path
+from app.booking.columnar import remove_derived
+from app.booking.datasets import user_dataset
+from app.booking.ingestion import ingest_file
+from app.booking.locks import async_dataset_lock
+from app.database import async_session_maker
 
 current_user = fastapi_users.current_user()
 
+# Seconds between progress events of ingestion job
+JOB_EVENTS_INTERVAL = 0.5
+
 csv_files_route = APIRouter(
     prefix='/csv_files',
     tags=['CSV Files Tools'],
@@ -33,7 +48,8 @@ csv_files_route = APIRouter(
 @csv_files_route.post(
     '/upload',
     summary='Upload and save csv file',
-    description='This API provides to upload and save csv file on server',
+    description='This API provides to upload and save csv file on server. '
+                'Returns size and SHA-256 checksum of saved file',
     status_code=status.HTTP_201_CREATED
 )
 async def upload_and_save_csv(csv_file: UploadFile = File(...)):
@@ -43,11 +59,13 @@ async def upload_and_save_csv(csv_file: UploadFile = File(...)):
         raise HTTPException(status_code=400,
                             detail="File haven't validated. Try again")
 
+    path = 'temporary/' + csv_file.filename.replace('/', '')  # Little basic safety
     try:
-        contents = await csv_file.read()
-        with open('temporary/' + csv_file.filename, "wb") as file:
-            file.write(first_line)
-            file.write(contents)
+        uploaded = await save_upload(csv_file, first_line, path)
+        analytics_executor.invalidate(path)
+        remove_derived(path)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=400,
                             detail="Can't upload this file. Try again or ask your system administrator for help")
@@ -55,10 +73,83 @@ async def upload_and_save_csv(csv_file: UploadFile = File(...)):
         await csv_file.close()
 
     return {
-        "message": f"Successfully uploaded file: {csv_file.filename}"
+        "message": f"Successfully uploaded file: {csv_file.filename}",
+        "size": uploaded["size"],
+        "sha256": uploaded["sha256"]
     }
 
 
+@csv_files_route.post(
+    '/append',
+    summary='Append new bookings to file set for analysis',
+    description='This API provides to append bookings of uploaded csv file to file set for analysis '
+                'and to table "booking" without full reload. Uploaded file must have the same header',
+    status_code=status.HTTP_200_OK
+)
+async def append_to_csv(csv_file: UploadFile = File(...),
+                        _user: User = Depends(current_user)):
+    # Cached user may be outdated, file and dataset are read from database
+    async with async_session_maker() as session:
+        csvfile, dataset_id = await user_dataset(session, _user.id)
+    if not csvfile or not os.path.isfile("temporary/" + csvfile):
+        raise HTTPException(status_code=400,
+                            detail="Set uploaded file for analysis first")
+
+    path = "temporary/" + csvfile
+    first_line = csv_file.file.readline()
+    if not is_csv_valid(first_line) or first_line.rstrip(b'\r\n') != read_header(path):
+        raise HTTPException(status_code=400,
+                            detail="File haven't validated. It must have the same header as file set for analysis")
+
+    # Concurrent appends upload their files side by side
+    delta_path = derived_path(path, f'.{uuid.uuid4().hex}.delta')
+    try:
+        await save_upload(csv_file, first_line, delta_path)
+        if not await run_in_threadpool(has_rows, delta_path):
+            raise HTTPException(status_code=400,
+                                detail="File has no bookings to append")
+
+        # Analytics and ingestion jobs read the file under shared lock, append waits for them
+        async with async_dataset_lock(path, exclusive=True):
+            async with async_session_maker() as session:
+                if await user_dataset(session, _user.id) != (csvfile, dataset_id):
+                    raise HTTPException(status_code=409,
+                                        detail="File for analysis has been changed. Try again")
+                if dataset_id is not None:
+                    await ingest_file(delta_path, session, dataset_id)
+
+                # File and table "booking" are changed together: file is cut back if commit fails
+                size = os.path.getsize(path)
+                appending = asyncio.ensure_future(run_in_threadpool(append_dataset, path, delta_path))
+                try:
+                    key, new_key, delta = await asyncio.shield(appending)
+                    await session.commit()
+                except BaseException:
+                    # Thread isn't stopped by cancellation of request: file is cut back
+                    # after it has been written, under the lock
+                    while not appending.done():
+                        try:
+                            await asyncio.wait([appending])
+                        except asyncio.CancelledError:
+                            pass
+                    truncate_dataset(path, size)
+                    raise
+
+            await analytics_executor.update_caches(append_cached, path, key, new_key, delta)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=400,
+                            detail="Can't append this file. Try again or ask your system administrator for help")
+    finally:
+        await csv_file.close()
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+
+    return {"message": f"{len(delta)} bookings have been appended to file {csvfile}",
+            "rows": len(delta)}
+
+
 @csv_files_route.get(
     '/list',
     summary='List of all uploaded csv files',
@@ -73,7 +164,7 @@ async def get_all_csv():
         uploaded_files_lst = []
         for root, dirs, files in os.walk("temporary"):
             for filename in files:
-                if filename != '.gitignore':
+                if not filename.startswith('.'):
                     uploaded_files_lst.append(filename)
         return {"Message": f"You have {len(uploaded_files_lst)} files",
                 "files": uploaded_files_lst
@@ -94,8 +185,10 @@ async def delete_all_uploaded_files():
     try:
         for root, dirs, files in os.walk("temporary"):
             for filename in files:
-                if filename != '.gitignore':
+                if not filename.startswith('.'):
                     os.remove("temporary/" + filename)
+                    remove_derived("temporary/" + filename)
+                    analytics_executor.invalidate("temporary/" + filename)
                     count += 1
 
         return {"message": f"All {count} file(s) have been deleted"}
@@ -114,6 +207,8 @@ async def delete_csv_file(filename: str):
     filename = filename.replace('/', '')  # Little basic safety
     try:
         os.remove("temporary/" + filename)
+        remove_derived("temporary/" + filename)
+        analytics_executor.invalidate("temporary/" + filename)
         return {"message": f"File {filename}  has been deleted"}
     except Exception:
         raise HTTPException(status_code=404,
@@ -123,53 +218,65 @@ async def delete_csv_file(filename: str):
 @csv_files_route.post(
     '/set/{filename}',
     summary='Set uploaded csv as file for analysis',
-    description='This API provides to set uploaded csv file for analysing (ability to use /bookings... endpoints)',
-    status_code=status.HTTP_201_CREATED
+    description='This API provides to set uploaded csv file for analysing (ability to use /bookings... endpoints). '
+                'Table "booking" is filled in background: API returns id of ingestion job, '
+                'use /csv_files/jobs/{job_id} for checking its progress',
+    status_code=status.HTTP_202_ACCEPTED
 )
 async def set_file_for_analysis(filename: str,
-                                _user: User = Depends(current_user),
-                                session: AsyncSession = Depends(get_async_session)):
+                                _user: User = Depends(current_user)):
     filename = filename.replace('/', '')  # Little basic safety
-    if os.path.isfile("temporary/" + filename):
-        try:
-            stmt = update(user).where(user.c.id == _user.id).values(csvfile=filename)
-            await session.execute(stmt)
+    if not os.path.isfile("temporary/" + filename):
+        raise HTTPException(status_code=404,
+                            detail="File not found!")
+
+    job = ingestion_jobs.submit(filename, _user.id)
 
-            stmt = delete(booking)
-            await session.execute(stmt)
+    return {"message": f"File {filename} will be set as file for analysing after filling of database",
+            "job_id": job.id,
+            "status_url": f"/csv_files/jobs/{job.id}"}
 
-            new_df = pd.DataFrame()
 
-            df = pd.read_csv('demo/hotel_booking_data.csv')
+def get_user_job(job_id: str, _user: User) -> IngestionJob:
+    job = ingestion_jobs.get(job_id)
+    if job is None or job.user_id != _user.id:
+        raise HTTPException(status_code=404,
+                            detail="Job not found!")
+    return job
 
-            new_df['booking_date'] = np.vectorize(booking_date)(df['arrival_date_day_of_month'],
-                                                                df['arrival_date_month'],
-                                                                df['arrival_date_year'],
-                                                                df['lead_time'])
-            new_df['length_of_stay'] = df['stays_in_week_nights'] + df['stays_in_weekend_nights']
-            new_df['guest_name'] = df['name']
-            new_df['daily_rate'] = df['adr']
 
-            result = new_df.to_dict()
+@csv_files_route.get(
+    '/jobs/{job_id}',
+    summary='Get status of ingestion job',
+    description='This API provides to get status of job started by /csv_files/set: '
+                'rows processed, throughput, ETA and error if job has failed',
+    status_code=status.HTTP_200_OK
+)
+async def get_job_status(job_id: str,
+                         _user: User = Depends(current_user)):
+    return get_user_job(job_id, _user).to_dict()
 
-            for i in range(len(new_df)):
-                stmt = insert(booking).values(booking_date=result['booking_date'][i],
-                                              length_of_stay=result['length_of_stay'][i],
-                                              guest_name=result['guest_name'][i],
-                                              daily_rate=result['daily_rate'][i])
-                await session.execute(stmt)
 
-            await session.commit()
+@csv_files_route.get(
+    '/jobs/{job_id}/events',
+    summary='Stream progress of ingestion job',
+    description='This API provides to get progress of job started by /csv_files/set as server-sent events '
+                'until job is finished',
+    status_code=status.HTTP_200_OK
+)
+async def get_job_events(job_id: str,
+                         _user: User = Depends(current_user)):
+    job = get_user_job(job_id, _user)
 
-            return {"message": f"File {filename} has been set as file for analysing",
-                    "db": f'Table "booking" in database has been filled'}
-        except Exception:
-            raise HTTPException(status_code=400,
-                                detail="Something is going wrong. Try again")
+    async def events():
+        while True:
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.done:
+                break
+            await asyncio.sleep(JOB_EVENTS_INTERVAL)
 
-    else:
-        raise HTTPException(status_code=404,
-                            detail="File not found!")
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 
 @csv_files_route.get(
@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+from fastapi import HTTPException
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+# Memory used by one upload is bounded by chunk size
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE_KB', '1024')) * 1024
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE_MB', '4096')) * 1024 * 1024
+# Boundaries and headers of multipart form around uploaded file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadSizeMiddleware:
+    """
+    ASGI middleware refusing requests with Content-Length over UPLOAD_MAX_SIZE
+    by 413 error before their body is received. Form with file is spooled to disk
+    before route is called, so save_upload() alone would refuse it only after that.
+    Bodies without Content-Length (chunked) are limited by save_upload().
+    """
+
+    def __init__(self, app, max_size: int = UPLOAD_MAX_SIZE + UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            length = dict(scope['headers']).get(b'content-length')
+            if length is not None and length.isdigit() and int(length) > self.max_size:
+                response = JSONResponse(status_code=413,
+                                        content={'detail': f"File is too large. Maximum size is "
+                                                           f"{UPLOAD_MAX_SIZE} bytes"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+async def save_upload(csv_file: UploadFile, first_line: bytes, path: str) -> dict:
+    """
+    Stream uploaded file to "path" by chunks of UPLOAD_CHUNK_SIZE bytes.
+    "first_line" is header already read from upload for validation.
+
+    File is written to hidden ".part" file and renamed to "path" on completion,
+    so readers never see partially written file. Raises 413 error as soon as
+    size exceeds UPLOAD_MAX_SIZE. Returns size and SHA-256 checksum of the file.
+    """
+    directory, filename = os.path.split(path)
+    partial = os.path.join(directory, '.' + filename + '.part')
+
+    checksum = hashlib.sha256(first_line)
+    size = len(first_line)
+
+    try:
+        with open(partial, 'wb') as file:
+            file.write(first_line)
+            while chunk := await csv_file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > UPLOAD_MAX_SIZE:
+                    raise HTTPException(status_code=413,
+                                        detail=f"File is too large. Maximum size is {UPLOAD_MAX_SIZE} bytes")
+                checksum.update(chunk)
+                await run_in_threadpool(file.write, chunk)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    return {"size": size, "sha256": checksum.hexdigest()}
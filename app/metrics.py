@@ -0,0 +1,266 @@
+"""
+Performance metrics of API in Prometheus text format.
+
+MetricsMiddleware records latency, response size and number of in-flight requests
+of every route. Stages of request processing (reading dataset, computing dates,
+grouping, SQL queries, serialization, ingestion steps) are measured by spans:
+
+    with span('dates'):
+        dates = booking_dates(df)
+
+Spans of a request are summed by name into histogram "span_duration_seconds" when
+request is finished and, with METRICS_SERVER_TIMING=1, sent in Server-Timing header.
+Spans outside of requests (e.g. of ingestion jobs) are recorded at once.
+With METRICS_ENABLED=0 middleware and /metrics aren't installed and span() does nothing.
+"""
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any
+from typing import Callable
+
+from fastapi import APIRouter
+from fastapi import Response
+from fastapi import status
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', '0') == '1'
+
+# Upper bounds of histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+PROMETHEUS_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [counts of buckets (the last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{bucket} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, value: float) -> None:
+        with self._lock:
+            self.value += value
+
+    def render(self) -> list[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge', f'{self.name} {self.value}']
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name: str, documentation: str, label_names: tuple, buckets: tuple) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        metric = Gauge(name, documentation)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram('http_request_duration_seconds', 'Latency of requests by route',
+                                      ('method', 'route', 'status'), LATENCY_BUCKETS)
+response_size = registry.histogram('http_response_size_bytes', 'Size of response bodies by route',
+                                   ('method', 'route'), SIZE_BUCKETS)
+requests_in_flight = registry.gauge('http_requests_in_flight', 'Requests being processed')
+span_duration = registry.histogram('span_duration_seconds', 'Duration of stages of processing',
+                                   ('span',), LATENCY_BUCKETS)
+
+
+class Timings:
+    """
+    Spans recorded while processing a request (or a computation in worker)
+    """
+
+    def __init__(self):
+        self.spans: list[tuple[str, float]] = []
+        self.open = True
+
+    def totals(self) -> dict[str, float]:
+        totals = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self, total: float) -> str:
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}'
+                         for name, seconds in [*self.totals().items(), ('total', total)])
+
+
+_timings: ContextVar[Timings | None] = ContextVar('timings', default=None)
+
+
+def record_span(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None and timings.open:
+        timings.spans.append((name, seconds))
+    else:
+        span_duration.observe((name,), seconds)
+
+
+class Span:
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_span(self.name, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str) -> Span | _NoSpan:
+    """
+    Context manager measuring stage "name" of processing
+    """
+    return Span(name) if METRICS_ENABLED else _NO_SPAN
+
+
+def call_with_spans(func: Callable, *args) -> tuple[Any, list[tuple[str, float]]]:
+    """
+    func(*args) and spans recorded by it. Used where spans can't reach
+    timings of request by themselves, e.g. in worker processes
+    """
+    if not METRICS_ENABLED:
+        return func(*args), []
+
+    token = _timings.set(Timings())
+    try:
+        result = func(*args)
+        return result, _timings.get().spans
+    finally:
+        _timings.reset(token)
+
+
+def record_spans(spans: list[tuple[str, float]]) -> None:
+    for name, seconds in spans:
+        record_span(name, seconds)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording metrics of every HTTP request
+    """
+
+    def __init__(self, app, server_timing: bool = METRICS_SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        response = {'status': 500, 'size': 0}
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                if self.server_timing:
+                    header = timings.server_timing(time.perf_counter() - start)
+                    message = {**message, 'headers': [*message.get('headers', []),
+                                                      (b'server-timing', header.encode())]}
+            elif message['type'] == 'http.response.body':
+                response['size'] += len(message.get('body', b''))
+            await send(message)
+
+        requests_in_flight.add(1)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            seconds = time.perf_counter() - start
+            requests_in_flight.add(-1)
+            timings.open = False
+            _timings.reset(token)
+
+            # Template of path, so requests of one route share series
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            request_duration.observe((scope['method'], route, response['status']), seconds)
+            response_size.observe((scope['method'], route), response['size'])
+            for name, total in timings.totals().items():
+                span_duration.observe((name,), total)
+
+
+metrics_route = APIRouter(tags=['Metrics'])
+
+
+@metrics_route.get('/metrics',
+                   summary='Performance metrics of API',
+                   description='Latency histograms, response sizes and in-flight requests by route, '
+                               'durations of processing stages. Prometheus text format',
+                   status_code=status.HTTP_200_OK)
+def get_metrics():
+    return Response(registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
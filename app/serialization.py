@@ -0,0 +1,60 @@
+"""
+Fast JSON serialization of API responses.
+
+Results of pandas are converted to nested dicts column-wise (natives are produced by
+tolist/to_dict), then encoded by orjson, which also understands numpy scalars,
+arrays and datetimes. Content already encoded to bytes is sent as is.
+"""
+from typing import Any
+from typing import Callable
+
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+from app.metrics import span
+
+# Keys of grouped results are years, flags etc., they become strings as with json module
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def call_serialized(func: Callable, *args) -> bytes | None:
+    """
+    JSON of func(*args), None if function has returned None.
+    Serializing next to computation (e.g. in worker process) saves
+    transferring and walking through nested dicts afterwards.
+    """
+    with span('compute'):
+        result = func(*args)
+    if result is None:
+        return None
+    with span('serialize'):
+        return dumps(result)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded by orjson. Bytes are treated as encoded JSON
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def nested_dict(series: pd.Series) -> dict:
+    """
+    {first level: {second level: value}} of series with two-level index
+    """
+    result = dict()
+    for key, inner_key, value in zip(series.index.get_level_values(0).tolist(),
+                                     series.index.get_level_values(1).tolist(),
+                                     series.tolist()):
+        result.setdefault(key, {})[inner_key] = value
+    return result
+
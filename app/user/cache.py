@@ -0,0 +1,65 @@
+import os
+import time
+from collections import OrderedDict
+
+from app.user.models import User
+
+# Seconds a resolved user is served without database. 0 disables cache
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+
+
+class UserCache:
+    """
+    LRU cache of users resolved from access tokens, entries live for "ttl" seconds
+    and never longer than their token.
+
+    Cache is kept by each process: changes of a user must be followed by invalidate(user_id),
+    changes made by other processes are seen after "ttl" at most.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries: OrderedDict[str, tuple[User, float]] = OrderedDict()
+
+    def get(self, token: str) -> User | None:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return user
+
+    def put(self, token: str, user: User, token_expires_at: float | None = None) -> None:
+        """
+        Cache "user" of "token". "token_expires_at" is expiration time of token as UNIX timestamp
+        """
+        if self.ttl <= 0:
+            return
+        ttl = self.ttl if token_expires_at is None else min(self.ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        self._entries[token] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate_token(self, token: str) -> None:
+        self._entries.pop(token, None)
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drop all entries of user, e.g. after the user has been changed
+        """
+        for token in [token for token, (user, _) in self._entries.items() if user.id == user_id]:
+            del self._entries[token]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+user_cache = UserCache()
@@ -2,6 +2,9 @@ from fastapi_users import FastAPIUsers
 from fastapi_users.authentication import CookieTransport
 from fastapi_users.authentication import JWTStrategy
 from fastapi_users.authentication import AuthenticationBackend
+from fastapi_users.manager import BaseUserManager
+import jwt
+from app.user.cache import user_cache
 from app.user.models import User
 from app.user.manager import get_user_manager
 
@@ -10,8 +13,34 @@ cookie_transport = CookieTransport(cookie_name="hotel", cookie_max_age=3600)
 SECRET = 'SECRET'
 
 
+class CachedJWTStrategy(JWTStrategy):
+    """
+    JWT strategy serving users of recently seen tokens from cache (see app.user.cache),
+    so authentication of a request doesn't query database on cache hit
+    """
+
+    async def read_token(self, token: str | None, user_manager: BaseUserManager[User, int]) -> User | None:
+        if token is None:
+            return None
+
+        user = user_cache.get(token)
+        if user is not None:
+            return user
+
+        user = await super().read_token(token, user_manager)
+        if user is not None:
+            # Token has been verified by read_token
+            expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp")
+            user_cache.put(token, user, expires_at)
+        return user
+
+    async def destroy_token(self, token: str, user: User) -> None:
+        user_cache.invalidate_token(token)
+        await super().destroy_token(token, user)
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return CachedJWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 
 auth_backend = AuthenticationBackend(
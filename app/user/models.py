@@ -21,6 +21,9 @@ class User(SQLAlchemyBaseUserTable[int], Base):
     csvfile: Mapped[str] = mapped_column(
         String(length=1024), unique=False
     )
+    dataset_id: Mapped[int | None] = mapped_column(
+        Integer, nullable=True
+    )
     hashed_password: Mapped[str] = mapped_column(
         String(length=1024), nullable=False
     )
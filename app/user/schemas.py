@@ -10,6 +10,7 @@ class UserRead(schemas.BaseUser[int]):
     email: str
     username: str
     csvfile: str
+    dataset_id: Optional[int] = None
     is_active: bool = True
     is_superuser: bool = False
     is_verified: bool = False
@@ -0,0 +1,60 @@
+"""
+Comparison of two reports of benchmarks.run, e.g. of two commits.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Prints p50/p95 latency of every endpoint in both reports and their ratio (new / old),
+ratios above "--threshold" are marked as regressions.
+"""
+import argparse
+import json
+
+METRICS = ['p50_ms', 'p95_ms']
+
+
+def ratio(old: float | None, new: float | None) -> float | None:
+    if not old or new is None:
+        return None
+    return new / old
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    lines = []
+    for size, new_result in new['sizes'].items():
+        old_result = old['sizes'].get(size)
+        if old_result is None:
+            continue
+
+        lines.append(f'{size} rows (ingest {old_result["ingest"]["seconds"]}s -> {new_result["ingest"]["seconds"]}s, '
+                     f'peak RSS {old_result["peak_rss_mb"]}MB -> {new_result["peak_rss_mb"]}MB)')
+        for name, endpoint in new_result['endpoints'].items():
+            if name not in old_result['endpoints']:
+                continue
+            cells = []
+            regression = False
+            for metric in METRICS:
+                before = old_result['endpoints'][name][metric]
+                after = endpoint[metric]
+                change = ratio(before, after)
+                regression |= change is not None and change > threshold
+                cells.append(f'{metric} {before:>10.2f} -> {after:>10.2f}'
+                             + (f' x{change:.2f}' if change is not None else ''))
+            lines.append(f'  {name:<34}' + '   '.join(cells) + ('  REGRESSION' if regression else ''))
+
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare two benchmark reports')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio of latencies (new / old) reported as regression')
+    args = parser.parse_args()
+
+    with open(args.old) as old, open(args.new) as new:
+        print('\n'.join(compare(json.load(old), json.load(new), args.threshold)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Generator of synthetic hotel booking datasets for benchmarks.
+
+Files have the same columns as demo/hotel_booking_data.csv (see app.csv_tool.validation.index)
+and are written by chunks, so datasets larger than memory can be produced. The same
+"rows" and "seed" always give the same file.
+
+    python -m benchmarks.generate 1m benchmarks/data/bookings_1m.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.csv_tool.validation import index
+
+# Order of columns in demo/hotel_booking_data.csv
+COLUMNS = ['hotel', 'is_canceled', 'lead_time', 'arrival_date_year', 'arrival_date_month',
+           'arrival_date_week_number', 'arrival_date_day_of_month', 'stays_in_weekend_nights',
+           'stays_in_week_nights', 'adults', 'children', 'babies', 'meal', 'country', 'market_segment',
+           'distribution_channel', 'is_repeated_guest', 'previous_cancellations',
+           'previous_bookings_not_canceled', 'reserved_room_type', 'assigned_room_type', 'booking_changes',
+           'deposit_type', 'agent', 'company', 'days_in_waiting_list', 'customer_type', 'adr',
+           'required_car_parking_spaces', 'total_of_special_requests', 'reservation_status',
+           'reservation_status_date', 'name', 'email', 'phone-number', 'credit_card']
+
+# Sizes of benchmark datasets by name
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+GENERATE_CHUNK_SIZE = int(os.getenv('GENERATE_CHUNK_SIZE', '500000'))
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+COUNTRIES = ['PRT', 'GBR', 'FRA', 'ESP', 'DEU', 'ITA', 'IRL', 'BEL', 'BRA', 'NLD', 'USA', 'CHE', 'CN', 'AUT',
+             'SWE', 'CHN', 'POL', 'ISR', 'RUS', 'NOR', 'ROU', 'FIN', 'DNK', 'AUS', 'AGO', 'LUX', 'MAR', 'TUR',
+             'ARG', 'JPN']
+FIRST_NAMES = ['Ernest', 'Andrea', 'Rebecca', 'Laura', 'Linda', 'Michael', 'James', 'Mary', 'Robert', 'Patricia',
+               'John', 'Jennifer', 'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph',
+               'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen', 'Daniel', 'Nancy', 'Matthew', 'Lisa']
+LAST_NAMES = ['Barnes', 'Baker', 'Jones', 'Murray', 'Smith', 'Johnson', 'Williams', 'Brown', 'Miller', 'Davis',
+              'Garcia', 'Rodriguez', 'Wilson', 'Martinez', 'Anderson', 'Taylor', 'Thomas', 'Hernandez', 'Moore',
+              'Martin', 'Jackson', 'Thompson', 'White', 'Lopez', 'Lee', 'Gonzalez', 'Harris', 'Clark']
+
+assert sorted(COLUMNS) == index
+
+
+def parse_size(size: str) -> int:
+    """
+    Number of rows by name of size ("10k", "1m") or as number
+    """
+    return SIZES.get(size.lower()) or int(size)
+
+
+def _optional(rng: np.random.Generator, values: np.ndarray, missing: float) -> np.ndarray:
+    return np.where(rng.random(len(values)) < missing, np.nan, values)
+
+
+def _digits(values: np.ndarray, width: int) -> pd.Series:
+    return pd.Series(values).astype(str).str.zfill(width)
+
+
+def generate_chunk(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    year = rng.integers(2015, 2018, rows)
+    month = rng.integers(0, 12, rows)
+    day = rng.integers(1, 29, rows)
+    arrival = pd.to_datetime({'year': year, 'month': month + 1, 'day': day})
+    weekend_nights = rng.integers(0, 5, rows)
+    week_nights = rng.integers(0, 11, rows)
+    is_canceled = rng.random(rows) < 0.37
+    status_date = arrival + pd.to_timedelta(np.where(is_canceled, -rng.integers(0, 60, rows),
+                                                     weekend_nights + week_nights), unit='D')
+
+    chunk = {
+        'hotel': rng.choice(['City Hotel', 'Resort Hotel'], rows, p=[0.66, 0.34]),
+        'is_canceled': is_canceled.astype(int),
+        'lead_time': rng.integers(0, 500, rows),
+        'arrival_date_year': year,
+        'arrival_date_month': np.array(MONTHS)[month],
+        'arrival_date_week_number': arrival.dt.isocalendar().week.to_numpy(),
+        'arrival_date_day_of_month': day,
+        'stays_in_weekend_nights': weekend_nights,
+        'stays_in_week_nights': week_nights,
+        'adults': rng.integers(1, 4, rows),
+        'children': _optional(rng, rng.integers(0, 3, rows), 0.001),
+        'babies': rng.choice([0, 1], rows, p=[0.99, 0.01]),
+        'meal': rng.choice(['BB', 'HB', 'SC', 'Undefined', 'FB'], rows, p=[0.77, 0.12, 0.09, 0.01, 0.01]),
+        'country': np.where(rng.random(rows) < 0.004, None, rng.choice(COUNTRIES, rows)),
+        'market_segment': rng.choice(['Online TA', 'Offline TA/TO', 'Groups', 'Direct', 'Corporate'], rows),
+        'distribution_channel': rng.choice(['TA/TO', 'Direct', 'Corporate', 'GDS'], rows,
+                                           p=[0.82, 0.12, 0.05, 0.01]),
+        'is_repeated_guest': (rng.random(rows) < 0.03).astype(int),
+        'previous_cancellations': rng.choice([0, 1, 2], rows, p=[0.94, 0.05, 0.01]),
+        'previous_bookings_not_canceled': rng.choice([0, 1, 2], rows, p=[0.97, 0.02, 0.01]),
+        'reserved_room_type': rng.choice(list('ABCDEFG'), rows),
+        'assigned_room_type': rng.choice(list('ABCDEFGHI'), rows),
+        'booking_changes': rng.choice([0, 1, 2], rows, p=[0.85, 0.1, 0.05]),
+        'deposit_type': rng.choice(['No Deposit', 'Non Refund', 'Refundable'], rows, p=[0.87, 0.12, 0.01]),
+        'agent': _optional(rng, rng.integers(1, 536, rows), 0.14),
+        'company': _optional(rng, rng.integers(6, 544, rows), 0.94),
+        'days_in_waiting_list': rng.choice([0, 1, 30], rows, p=[0.97, 0.02, 0.01]),
+        'customer_type': rng.choice(['Transient', 'Transient-Party', 'Contract', 'Group'], rows),
+        'adr': rng.gamma(4, 25, rows).round(2),
+        'required_car_parking_spaces': rng.choice([0, 1], rows, p=[0.94, 0.06]),
+        'total_of_special_requests': rng.integers(0, 4, rows),
+        'reservation_status': np.where(is_canceled, 'Canceled', 'Check-Out'),
+        'reservation_status_date': status_date.dt.strftime('%Y-%m-%d'),
+        'name': (pd.Series(rng.choice(FIRST_NAMES, rows)) + ' ' + pd.Series(rng.choice(LAST_NAMES, rows))),
+        'email': (pd.Series(rng.choice(FIRST_NAMES, rows)) + '.' + pd.Series(rng.choice(LAST_NAMES, rows))
+                  + '@gmail.com'),
+        'phone-number': (_digits(rng.integers(200, 1000, rows), 3) + '-' + _digits(rng.integers(0, 1000, rows), 3)
+                         + '-' + _digits(rng.integers(0, 10000, rows), 4)),
+        'credit_card': '************' + _digits(rng.integers(0, 10000, rows), 4),
+    }
+
+    return pd.DataFrame(chunk, columns=COLUMNS)
+
+
+def generate(path: str, rows: int, seed: int = 0, chunk_size: int = GENERATE_CHUNK_SIZE) -> str:
+    """
+    Write dataset of "rows" bookings to "path". Existing file is overwritten
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    with open(path, 'w', newline='') as file:
+        for start in range(0, rows, chunk_size):
+            chunk = generate_chunk(rng, min(chunk_size, rows - start))
+            chunk.to_csv(file, index=False, header=start == 0)
+        if not rows:
+            file.write(','.join(COLUMNS) + '\n')
+
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate synthetic hotel booking dataset')
+    parser.add_argument('rows', help='number of rows or one of: ' + ', '.join(SIZES))
+    parser.add_argument('path', help='path of CSV file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.path, parse_size(args.rows), args.seed)
+
+
+if __name__ == '__main__':
+    main()
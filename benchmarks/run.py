@@ -0,0 +1,312 @@
+"""
+In-process benchmarks of API.
+
+For every size a synthetic dataset (see benchmarks.generate) is uploaded, set for analysis
+and ingested, then every /bookings endpoint is requested "repeat" times. The app is run
+by TestClient in a temporary working directory with its own hotel.db, requests are
+authenticated as in production (JWT cookie, HTTP basic for demo file endpoints).
+Database is set by DATABASE_URL as for the app (see app/database.py).
+
+Report is written as JSON: latency percentiles and throughput of every endpoint,
+upload and ingestion time, bytes per row of loaded dataset and peak RSS of the process after each phase.
+
+    python -m benchmarks.run --sizes 10k 100k --output benchmarks/results/report.json
+    python -m benchmarks.compare old.json new.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.generate import generate  # noqa: E402
+from benchmarks.generate import parse_size  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+# Rows of dataset measured for bytes per row with inferred and declared types
+SCHEMA_REPORT_ROWS = 100_000
+
+# Prefixes of environment variables with settings of app, they are saved in report
+SETTINGS_PREFIXES = ('ANALYTICS_', 'BOOKINGS_', 'CUBE_', 'DATAFRAME_', 'DATASET_', 'EXPORT_', 'INGESTION_')
+
+USER = {"username": "root",
+        "email": "root",
+        "csvfile": "",
+        "password": "root"}
+BASIC_AUTH = ('root', 'root')
+
+JOB_POLL_INTERVAL = 0.05
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of benchmark process (ru_maxrss is in kilobytes on Linux)
+    """
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def latency_stats(samples: list[float]) -> dict:
+    """
+    Percentiles of latencies (seconds) in milliseconds and sequential throughput
+    """
+    samples = np.array(samples) * 1000
+    return {'count': len(samples),
+            'mean_ms': round(float(samples.mean()), 3),
+            'min_ms': round(float(samples.min()), 3),
+            'p50_ms': round(float(np.percentile(samples, 50)), 3),
+            'p90_ms': round(float(np.percentile(samples, 90)), 3),
+            'p95_ms': round(float(np.percentile(samples, 95)), 3),
+            'p99_ms': round(float(np.percentile(samples, 99)), 3),
+            'max_ms': round(float(samples.max()), 3),
+            'requests_per_second': round(len(samples) / samples.sum() * 1000, 2)}
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def create_schema() -> None:
+    from app.database import engine
+    from models.models import metadata
+
+    async with engine.begin() as connection:
+        await connection.run_sync(metadata.create_all)
+    # Connections are bound to event loop, the app runs in another one
+    await engine.dispose()
+
+
+def dataset_file(size: str, seed: int) -> str:
+    """
+    Generated dataset of "size", it is reused by later runs
+    """
+    path = os.path.join(DATA_DIR, f'bookings_{size.lower()}_{seed}.csv')
+    if not os.path.isfile(path):
+        print(f'Generating {path}')
+        generate(path + '.tmp', parse_size(size), seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def measure(client, url: str, repeat: int, **kwargs) -> dict:
+    """
+    Latency of the first (cold) request and statistics of "repeat" following ones
+    """
+    latencies = []
+    sizes = []
+    errors = 0
+    first_ms = None
+
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        response = client.get(url, **kwargs)
+        seconds = time.perf_counter() - start
+        if response.status_code != 200:
+            errors += 1
+        if i == 0:
+            first_ms = round(seconds * 1000, 3)
+        else:
+            latencies.append(seconds)
+            sizes.append(len(response.content))
+
+    return {'url': url,
+            'params': kwargs.get('params'),
+            'first_ms': first_ms,
+            **latency_stats(latencies),
+            'response_bytes': int(np.mean(sizes)),
+            'errors': errors,
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def upload(client, path: str, filename: str) -> dict:
+    file_bytes = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        start = time.perf_counter()
+        response = client.post('/csv_files/upload', files={'csv_file': (filename, file, 'text/csv')})
+        seconds = time.perf_counter() - start
+    response.raise_for_status()
+
+    return {'seconds': round(seconds, 3),
+            'megabytes_per_second': round(file_bytes / seconds / 1024 / 1024, 2),
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def ingest(client, filename: str, rows: int) -> dict:
+    """
+    Set uploaded file for analysis and wait for its ingestion job
+    """
+    start = time.perf_counter()
+    response = client.post(f'/csv_files/set/{filename}')
+    response.raise_for_status()
+    status_url = response.json()['status_url']
+
+    while True:
+        job = client.get(status_url).json()
+        if job['status'] in ('finished', 'failed'):
+            break
+        time.sleep(JOB_POLL_INTERVAL)
+    seconds = time.perf_counter() - start
+    if job['status'] == 'failed':
+        raise RuntimeError(f'Ingestion of {filename} has failed: {job["error"]}')
+
+    return {'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds),
+            'job_seconds': job['elapsed_seconds'],
+            'peak_rss_mb': peak_rss_mb()}
+
+
+def endpoints(client) -> dict[str, tuple[str, dict]]:
+    """
+    Requests of benchmark by name: (url, keyword arguments of client.get)
+    """
+    booking = client.get('/bookings/', params={'limit': 1}).json()['items'][0]
+    first_name = booking['guest_name'].split()[0]
+
+    return {
+        'list': ('/bookings/', {'params': {'limit': 100}}),
+        'list_by_daily_rate': ('/bookings/', {'params': {'limit': 100, 'order_by': 'daily_rate'}}),
+        'booking_by_id': (f'/bookings/{booking["id"]}', {}),
+        'search_guest_name': ('/bookings/search', {'params': {'guest_name': booking['guest_name']}}),
+        'search_guest_name_prefix': ('/bookings/search', {'params': {'guest_name': first_name[:3]}}),
+        'search_booking_date': ('/bookings/search', {'params': {'booking_date': booking['booking_date']}}),
+        'search_daily_rate_range': ('/bookings/search', {'params': {'daily_rate_min': 100, 'daily_rate_max': 101}}),
+        'export_csv': ('/bookings/export', {'params': {'format': 'csv'}}),
+        'export_ndjson': ('/bookings/export', {'params': {'format': 'ndjson'}}),
+        'export_arrow': ('/bookings/export', {'params': {'format': 'arrow'}}),
+        'stats': ('/bookings/stats', {}),
+        'analysis_booking': ('/bookings/analysis', {}),
+        'analysis_arrival_canceled': ('/bookings/analysis', {'params': {'type_group': 'arrival',
+                                                                        'is_canceled': True}}),
+        'nationality': ('/bookings/nationality', {'params': {'nationality': 'PRT', 'start': 0, 'step': 100}}),
+        'popular_meal_package': ('/bookings/get_popular_meal_package', {}),
+        'avg_length_of_stay': ('/bookings/get_avg_length_of_stay', {}),
+        'total_revenue': ('/bookings/total_revenue', {}),
+        'top_countries': ('/bookings/top_countries', {}),
+        'repeated_guests_percentage': ('/bookings/repeated_guests_percentage', {}),
+        'total_guests_by_year': ('/bookings/total_guests_by_year', {}),
+        'avg_daily_rate_resort': ('/bookings/avg_daily_rate_resort', {'auth': BASIC_AUTH}),
+        'most_common_arrival_day_city': ('/bookings/most_common_arrival_day_city', {'auth': BASIC_AUTH}),
+        'count_by_hotel_meal': ('/bookings/count_by_hotel_meal', {'auth': BASIC_AUTH}),
+        'total_revenue_resort_by_country': ('/bookings/total_revenue_resort_by_country', {'auth': BASIC_AUTH}),
+        'count_by_hotel_repeated_guest': ('/bookings/count_by_hotel_repeated_guest', {'auth': BASIC_AUTH}),
+        'aggregate_cube': ('/bookings/aggregate', {'params': {'group_by': ['hotel', 'booking_month'],
+                                                              'metrics': ['sum_revenue']}}),
+        'aggregate_dataset': ('/bookings/aggregate', {'params': {'group_by': ['market_segment'],
+                                                                 'metrics': ['max_adr', 'mean_stay']}}),
+        'cache_stats': ('/bookings/cache_stats', {}),
+    }
+
+
+def run_size(client, size: str, seed: int, repeat: int, export_repeat: int) -> dict:
+    path = dataset_file(size, seed)
+    rows = parse_size(size)
+    filename = os.path.basename(path)
+
+    # Endpoints of demo file analyse the same dataset
+    if os.path.lexists('demo/hotel_booking_data.csv'):
+        os.remove('demo/hotel_booking_data.csv')
+    os.symlink(path, 'demo/hotel_booking_data.csv')
+
+    print(f'{size}: upload')
+    from app.booking.schema import schema_report
+
+    report = schema_report(path, SCHEMA_REPORT_ROWS)
+    result = {'rows': rows,
+              'file_bytes': os.path.getsize(path),
+              'bytes_per_row': {'inferred': report['inferred_bytes_per_row'],
+                                'declared': report['declared_bytes_per_row']},
+              'upload': upload(client, path, filename)}
+    print(f'{size}: set and ingest')
+    result['ingest'] = ingest(client, filename, rows)
+
+    result['endpoints'] = {}
+    for name, (url, kwargs) in endpoints(client).items():
+        print(f'{size}: {name}')
+        result['endpoints'][name] = measure(client, url, export_repeat if name.startswith('export') else repeat,
+                                            **kwargs)
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark API on synthetic datasets')
+    parser.add_argument('--sizes', nargs='+', default=['10k', '100k'],
+                        help='sizes of datasets: 10k, 100k, 1m, 10m or number of rows')
+    parser.add_argument('--repeat', type=int, default=20, help='requests per endpoint after the first one')
+    parser.add_argument('--export-repeat', type=int, default=3, help='requests per export endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='path of JSON report')
+    args = parser.parse_args()
+
+    revision = commit()
+    output = os.path.abspath(args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                                         f'{(revision or "report")[:12]}.json'))
+    for size in args.sizes:
+        dataset_file(size, args.seed)
+
+    # App uses paths relative to working directory: ./hotel.db, temporary/, demo/
+    workdir = tempfile.mkdtemp(prefix='hotel_benchmark_')
+    os.chdir(workdir)
+    os.mkdir('demo')
+
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    asyncio.run(create_schema())
+
+    report = {'commit': revision,
+              'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'cpu_count': os.cpu_count(),
+              'settings': {name: value for name, value in sorted(os.environ.items())
+                           if name.startswith(SETTINGS_PREFIXES)},
+              'repeat': args.repeat,
+              'export_repeat': args.export_repeat,
+              'seed': args.seed,
+              'sizes': {}}
+
+    try:
+        # Auth cookie is secure, so requests are sent by https
+        with TestClient(app, base_url='https://testserver') as client:
+            response = client.post('/auth/register', json=USER)
+            # User is kept in database of previous runs, unless it is SQLite in working directory
+            if response.status_code != 400:
+                response.raise_for_status()
+            client.post('/auth/jwt/login', data={'username': USER['email'],
+                                                 'password': USER['password']}).raise_for_status()
+            for size in args.sizes:
+                report['sizes'][size] = run_size(client, size, args.seed, args.repeat, args.export_repeat)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Workers of analytics pool have exited at shutdown of app
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['peak_rss_children_mb'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Report: {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,14 +3,21 @@ from typing import Annotated
 from fastapi import FastAPI, Depends
 
 from app.csv_tool.routes import csv_files_route
+from app.csv_tool.upload import UploadSizeMiddleware
+from app.booking.cache import enable_copy_on_write
+from app.booking.executor import analytics_executor
 from app.booking.routes import bookings_routes
+from app.metrics import METRICS_ENABLED
+from app.metrics import MetricsMiddleware
+from app.metrics import metrics_route
+from app.serialization import FastJSONResponse
 from app.user.config import auth_backend
 from app.user.config import fastapi_users
 from app.user.models import User
 from app.user.schemas import UserRead, UserCreate
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
@@ -26,3 +33,20 @@ app.include_router(
 
 app.include_router(csv_files_route)
 app.include_router(bookings_routes)
+
+app.add_middleware(UploadSizeMiddleware)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics_route)
+
+
+@app.on_event("startup")
+def configure_pandas():
+    # Frames of dataset cache are shared between requests (see app/booking/cache.py)
+    enable_copy_on_write()
+
+
+@app.on_event("shutdown")
+def shutdown_analytics_executor():
+    analytics_executor.shutdown()
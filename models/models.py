@@ -1,4 +1,5 @@
-from sqlalchemy import MetaData, Column, Table, Integer, String, Boolean, Float, Date
+from sqlalchemy import MetaData, Column, Table, Integer, String, Boolean, Float, Date, DateTime, Index, ForeignKey
+from sqlalchemy import DDL, event, false
 
 metadata = MetaData()
 
@@ -9,12 +10,31 @@ user = Table(
     Column("username", String(length=320), unique=True, nullable=False),
     Column("email", String(length=320), unique=True, nullable=False),
     Column("csvfile", String(length=1024), unique=False),
+    # Dataset of bookings loaded from "csvfile" (see "dataset" table)
+    Column("dataset_id", Integer),
     Column("hashed_password", String(length=1024), nullable=False),
     Column("is_active", Boolean, default=True, nullable=False),
     Column("is_superuser", Boolean, default=False, nullable=False),
     Column("is_verified", Boolean, default=False, nullable=False),
 )
 
+# Bookings loaded from csv files by users. Each user reads bookings of own active dataset only,
+# so a reload is built as "loading" dataset and switched to in one transaction
+dataset = Table(
+    "dataset",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("filename", String(length=1024), nullable=False),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+    Column("status", String(length=16), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    # Retired datasets are dropped with delay, see app/booking/datasets.py
+    Column("retired_at", DateTime),
+    # Bookings have analytic columns, so analytics of dataset are computed by SQL (app/booking/pushdown.py).
+    # Datasets loaded before the columns were added have them empty
+    Column("has_analytic_columns", Boolean, nullable=False, server_default=false()),
+)
+
 booking = Table(
     "booking",
     metadata,
@@ -22,5 +42,67 @@ booking = Table(
     Column("booking_date", Date),
     Column("length_of_stay", Integer),
     Column("guest_name", String(length=1024)),
-    Column("daily_rate", Float)
-)
\ No newline at end of file
+    Column("daily_rate", Float),
+    Column("dataset_id", Integer, ForeignKey("dataset.id")),
+    # Columns of dataset for analytics endpoints
+    Column("hotel", String(length=64)),
+    Column("country", String(length=64)),
+    Column("meal", String(length=64)),
+    Column("is_canceled", Integer),
+    Column("is_repeated_guest", Integer),
+    Column("adults", Integer),
+    Column("children", Integer),
+    Column("babies", Integer),
+    Column("arrival_year", Integer),
+    Column("arrival_month", String(length=16)),
+    Column("booking_year", Integer),
+    Column("booking_month", Integer),
+)
+
+# Indexes for keyset pagination of bookings ordered by id, date or daily rate and for search
+# inside of dataset. Full-text index of guest names is declared below
+Index("ix_booking_dataset_id_id", booking.c.dataset_id, booking.c.id)
+Index("ix_booking_dataset_length_of_stay_id", booking.c.dataset_id, booking.c.length_of_stay, booking.c.id)
+# Counts of bookings by country and by meal package are read from index alone
+Index("ix_booking_dataset_country", booking.c.dataset_id, booking.c.country)
+Index("ix_booking_dataset_meal", booking.c.dataset_id, booking.c.meal)
+
+
+def _not_postgresql(ddl, target, bind, dialect, **kw) -> bool:
+    return dialect.name != 'postgresql'
+
+
+# Pages put empty values first. SQLite does it by default and can't declare it in index,
+# ascending index of PostgreSQL keeps NULL last, so it has own indexes
+Index("ix_booking_dataset_booking_date_id", booking.c.dataset_id, booking.c.booking_date, booking.c.id) \
+    .ddl_if(callable_=_not_postgresql)
+Index("ix_booking_dataset_daily_rate_id", booking.c.dataset_id, booking.c.daily_rate, booking.c.id) \
+    .ddl_if(callable_=_not_postgresql)
+Index("ix_booking_dataset_booking_date_nulls_first_id", booking.c.dataset_id, booking.c.booking_date.nulls_first(),
+      booking.c.id).ddl_if(dialect='postgresql')
+Index("ix_booking_dataset_daily_rate_nulls_first_id", booking.c.dataset_id, booking.c.daily_rate.nulls_first(),
+      booking.c.id).ddl_if(dialect='postgresql')
+
+# There is no full-text index in PostgreSQL: names are searched by prefix, pattern index serves LIKE 'prefix%'
+Index("ix_booking_dataset_guest_name", booking.c.dataset_id, booking.c.guest_name,
+      postgresql_ops={'guest_name': 'text_pattern_ops'}).ddl_if(dialect='postgresql')
+
+# Full-text index of guest names in SQLite (app/booking/fulltext.py): external-content FTS5 table
+# kept in sync by triggers. Prefix indexes make "name*" queries as fast as queries of whole words.
+# External-content index must be told the values it has indexed when they are deleted.
+# The same statements are executed by migration 5d2e8a61f3b7, batch operations of SQLite
+# recreating "booking" table drop the triggers and must create them again.
+booking_fulltext_ddl = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS booking_fts "
+    "USING fts5(guest_name, content='booking', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS booking_fts_insert AFTER INSERT ON booking BEGIN "
+    "INSERT INTO booking_fts(rowid, guest_name) VALUES (new.id, new.guest_name); END",
+    "CREATE TRIGGER IF NOT EXISTS booking_fts_delete AFTER DELETE ON booking BEGIN "
+    "INSERT INTO booking_fts(booking_fts, rowid, guest_name) VALUES ('delete', old.id, old.guest_name); END",
+    "CREATE TRIGGER IF NOT EXISTS booking_fts_update AFTER UPDATE OF guest_name ON booking BEGIN "
+    "INSERT INTO booking_fts(booking_fts, rowid, guest_name) VALUES ('delete', old.id, old.guest_name); "
+    "INSERT INTO booking_fts(rowid, guest_name) VALUES (new.id, new.guest_name); END",
+]
+for statement in booking_fulltext_ddl:
+    event.listen(booking, "after_create", DDL(statement).execute_if(dialect='sqlite'))
+event.listen(booking, "before_drop", DDL("DROP TABLE IF EXISTS booking_fts").execute_if(dialect='sqlite'))
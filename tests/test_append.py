@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import pytest
+
+from benchmarks.generate import generate
+from benchmarks.run import USER
+from benchmarks.run import create_schema
+from benchmarks.run import ingest
+from benchmarks.run import upload
+
+ROWS = 1000
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    # App uses paths relative to working directory: ./hotel.db, temporary/, demo/
+    workdir = tmp_path_factory.mktemp('hotel')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.mkdir('demo')
+
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    asyncio.run(create_schema())
+    try:
+        # Auth cookie is secure, so requests are sent by https
+        with TestClient(app, base_url='https://testserver') as client:
+            client.post('/auth/register', json=USER).raise_for_status()
+            client.post('/auth/jwt/login', data={'username': USER['email'],
+                                                 'password': USER['password']}).raise_for_status()
+            upload(client, generate(str(workdir / 'source.csv'), ROWS), 'hotel.csv')
+            ingest(client, 'hotel.csv', ROWS)
+            yield client
+    finally:
+        os.chdir(cwd)
+
+
+def test_append_without_rows_is_refused(client):
+    path = 'temporary/hotel.csv'
+    with open(path, 'rb') as file:
+        content = file.read()
+    header = content.split(b'\n', 1)[0]
+    # Cube and caches of dataset are built before append
+    expected = client.get('/bookings/get_avg_length_of_stay')
+    assert expected.status_code == 200
+
+    for delta in (header, header + b'\n', header + b'\n\n'):
+        response = client.post('/csv_files/append', files={'csv_file': ('delta.csv', delta, 'text/csv')})
+        assert response.status_code == 400
+
+    with open(path, 'rb') as file:
+        assert file.read() == content
+    response = client.get('/bookings/get_avg_length_of_stay')
+    assert response.status_code == 200
+    assert response.json() == expected.json()
+
+
+def test_append_cube_without_rows(tmp_path):
+    from app.booking.cache import read_csv
+    from app.booking.cube import append_cube
+    from app.booking.cube import build_cube
+    from app.booking.schema import apply_schema
+
+    cube = build_cube(apply_schema(read_csv(generate(str(tmp_path / 'hotel.csv'), 100))))
+    # Columns of file with header alone have no types
+    delta = apply_schema(read_csv(generate(str(tmp_path / 'delta.csv'), 0)))
+    appended = append_cube(cube, delta)
+
+    assert appended.dtypes.equals(cube.dtypes)
+    assert appended.equals(cube)